@@ -26,14 +26,25 @@ THE SOFTWARE.
 """
 
 import sys
+from functools import lru_cache, partial
 from warnings import warn
 
+import loopy as lp
 from arraycontext import (
     PyOpenCLArrayContext as PyOpenCLArrayContextBase,
     PytatoPyOpenCLArrayContext as PytatoPyOpenCLArrayContextBase)
 from arraycontext.pytest import (
     _PytestPyOpenCLArrayContextFactoryWithClass,
     _PytestPytatoPyOpenCLArrayContextFactory, register_pytest_array_context_factory)
+from arraycontext.transform_metadata import ElementwiseMapKernelTag
+from loopy.diagnostic import LoopyError
+from loopy.kernel.data import HardwareConcurrentTag
+from loopy.symbolic import TaggedVariable
+from pymbolic.primitives import Subscript, Variable
+
+from meshmode.transform_metadata import (
+    ConcurrentBatchInameTag, ConcurrentDOFInameTag, ConcurrentElementInameTag,
+    FirstAxisIsElementsTag)
 
 
 def thaw(actx, ary):
@@ -47,21 +58,87 @@ def thaw(actx, ary):
 
 # {{{ kernel transform function
 
+_FIRST_AXIS_IS_ELEMENTS_TAG = FirstAxisIsElementsTag()
+
+# Checked by exact type, which is cheaper than isinstance. The only subclass
+# of Variable that shows up in loopy kernels is TaggedVariable.
+_VARIABLE_TYPES = frozenset({Variable, TaggedVariable})
+
+
+def _get_names_by_tag_type(objs):
+    """Return a mapping from tag types to the names of those of *objs* (e.g.
+    kernel arguments or inames) that carry a tag of that type.
+
+    Tags are looked up by their exact type, which avoids repeated scans over
+    the tags of each object.
+    """
+    result = {}
+    for obj in objs:
+        for tag in obj.tags:
+            result.setdefault(type(tag), []).append(obj.name)
+
+    return result
+
+
 def _transform_loopy_inner(t_unit):
-    import loopy as lp
-    from arraycontext.transform_metadata import ElementwiseMapKernelTag
-    from pymbolic.primitives import Subscript, Variable
+    transform = _get_kernel_transform(t_unit.default_entrypoint)
+    if transform is None:
+        return None
+
+    return transform(t_unit)
+
+
+def _transform_identity(t_unit):
+    return t_unit
+
 
-    from meshmode.transform_metadata import FirstAxisIsElementsTag
+def _transform_with_kernel(t_unit, kernel, transform):
+    return transform(t_unit.with_kernel(kernel))
 
-    default_ep = t_unit.default_entrypoint
+
+# The transform only depends on the names of the inames, so kernels that
+# agree on those share it. Unlike the kernels, the keys are cheap to hash.
+@lru_cache(maxsize=256)
+def _get_element_and_dof_transform(el_inames, dof_inames, batch_inames):
+    return partial(_transform_with_element_and_dof_inames,
+            el_inames=el_inames, dof_inames=dof_inames, batch_inames=batch_inames)
+
+
+def _get_kernel_transform(default_ep):
+    """Determine how to transform a translation unit with the default
+    entrypoint *default_ep*.
+
+    :returns: a function that takes such a translation unit and returns its
+        transformed version, or *None* if no transformation is known.
+    """
+    if not default_ep.instructions:
+        return None
+
+    iname_names_by_tag_type = _get_names_by_tag_type(default_ep.inames.values())
+
+    # Inames that were already mapped onto hardware axes by the creator of the
+    # kernel are left alone.
+    hw_tagged_inames = frozenset(
+            iname
+            for tag_type, inames in iname_names_by_tag_type.items()
+            if issubclass(tag_type, HardwareConcurrentTag)
+            for iname in inames)
+
+    assignments = tuple(
+            stmt for stmt in default_ep.instructions
+            if isinstance(stmt, lp.MultiAssignmentBase))
+
+    tagged_batch_inames = frozenset(
+            iname_names_by_tag_type.get(ConcurrentBatchInameTag, ()))
+    retagged_kernel = None
 
     # FIXME: Firedrake branch lacks kernel tags
-    kernel_tags = getattr(default_ep, "tags", ())
+    kernel_tag_types = frozenset(
+            type(tag) for tag in getattr(default_ep, "tags", ()))
 
     # {{{ FirstAxisIsElementsTag on kernel (compatibility)
 
-    if any(isinstance(tag, FirstAxisIsElementsTag) for tag in kernel_tags):
+    if FirstAxisIsElementsTag in kernel_tag_types:
         if (len(default_ep.instructions) != 1
                 or not isinstance(
                     default_ep.instructions[0], lp.Assignment)):
@@ -75,120 +152,197 @@ def _transform_loopy_inner(t_unit):
                     "must be a subscript")
 
         output_name = stmt.assignee.aggregate.name
-        new_args = [
-                arg.tagged(FirstAxisIsElementsTag())
-                if arg.name == output_name else arg
-                for arg in default_ep.args]
-        default_ep = default_ep.copy(args=new_args)
-        t_unit = t_unit.with_kernel(default_ep)
+
+        changed = False
+        new_args = []
+        for arg in default_ep.args:
+            if (arg.name == output_name
+                    and _FIRST_AXIS_IS_ELEMENTS_TAG not in arg.tags):
+                arg = arg.tagged(_FIRST_AXIS_IS_ELEMENTS_TAG)
+                changed = True
+            new_args.append(arg)
+
+        if changed:
+            default_ep = retagged_kernel = default_ep.copy(args=new_args)
 
     # }}}
 
-    # {{{ ElementwiseMapKernelTag on kernel
-
-    if any(isinstance(tag, ElementwiseMapKernelTag) for tag in kernel_tags):
-        el_inames = []
-        dof_inames = []
-        for stmt in default_ep.instructions:
-            if isinstance(stmt, lp.MultiAssignmentBase):
-                for assignee in stmt.assignees:
-                    if isinstance(assignee, Variable):
-                        # some scalar assignee kernel => no concurrency in the
-                        # workload => skip
-                        continue
-                    if not isinstance(assignee, Subscript):
-                        raise ValueError("assignees in "
-                                "ElementwiseMapKernelTag-tagged kernels must be "
-                                "subscripts")
-
-                    for i, subscript in enumerate(assignee.index_tuple[:2]):
-                        if (not isinstance(subscript, Variable)
-                                or subscript.name not in default_ep.all_inames()):
-                            raise ValueError("subscripts in "
-                                    "ElementwiseMapKernelTag-tagged kernels must be "
-                                    "inames")
-
-                        if i == 0:
-                            el_inames.append(subscript.name)
-                        elif i == 1:
-                            dof_inames.append(subscript.name)
-
-        return _transform_with_element_and_dof_inames(t_unit, el_inames, dof_inames)
+    # {{{ ElementwiseMapKernelTag on kernel / FirstAxisIsElementsTag on output
+
+    has_ewm_tag = ElementwiseMapKernelTag in kernel_tag_types
+    if has_ewm_tag:
+        first_axis_el_args = frozenset()
+        tag_name = "ElementwiseMapKernelTag"
+    else:
+        first_axis_el_args = frozenset(
+                _get_names_by_tag_type(default_ep.args)
+                .get(FirstAxisIsElementsTag, ()))
+        tag_name = "FirstAxisIsElementsTag"
+
+    if has_ewm_tag or first_axis_el_args:
+        all_inames = frozenset(default_ep.all_inames())
+
+        el_inames = set()
+        dof_inames = set()
+        batch_inames = set()
+        el_inames_add = el_inames.add
+        dof_inames_add = dof_inames.add
+
+        for stmt in assignments:
+            for assignee in stmt.assignees:
+                assignee_type = type(assignee)
+                if has_ewm_tag and assignee_type in _VARIABLE_TYPES:
+                    # some scalar assignee kernel => no concurrency in the
+                    # workload => skip
+                    continue
+                if assignee_type is not Subscript:
+                    raise ValueError(f"assignees in {tag_name}-tagged kernels "
+                            "must be subscripts")
+
+                if (not has_ewm_tag
+                        and assignee.aggregate.name not in first_axis_el_args):
+                    continue
+
+                index_tuple = assignee.index_tuple
+                subscripts = index_tuple[:2]
+                for subscript in subscripts:
+                    if (type(subscript) not in _VARIABLE_TYPES
+                            or subscript.name not in all_inames):
+                        raise ValueError(f"subscripts in {tag_name}-tagged "
+                                "kernels must be inames")
+
+                el_inames_add(subscripts[0].name)
+                if len(subscripts) > 1:
+                    dof_inames_add(subscripts[1].name)
+
+                if len(index_tuple) > 2:
+                    batch_subscript = index_tuple[2]
+                    if (type(batch_subscript) in _VARIABLE_TYPES
+                            and batch_subscript.name in tagged_batch_inames):
+                        batch_inames.add(batch_subscript.name)
+
+        transform = _get_element_and_dof_transform(
+                el_inames=frozenset(el_inames) - hw_tagged_inames,
+                dof_inames=frozenset(dof_inames) - hw_tagged_inames,
+                batch_inames=frozenset(batch_inames) - hw_tagged_inames)
+        if retagged_kernel is not None:
+            transform = partial(_transform_with_kernel,
+                    kernel=retagged_kernel, transform=transform)
+
+        return transform
 
     # }}}
 
-    # {{{ FirstAxisIsElementsTag on output variable
+    # {{{ element/dof iname tag
 
-    first_axis_el_args = [arg.name for arg in default_ep.args
-            if any(isinstance(tag, FirstAxisIsElementsTag) for tag in arg.tags)]
+    el_inames = set(iname_names_by_tag_type.get(ConcurrentElementInameTag, ()))
+    dof_inames = set(iname_names_by_tag_type.get(ConcurrentDOFInameTag, ()))
 
-    if first_axis_el_args:
-        el_inames = []
-        dof_inames = []
+    if el_inames:
+        return _get_element_and_dof_transform(
+                el_inames=frozenset(el_inames) - hw_tagged_inames,
+                dof_inames=frozenset(dof_inames) - hw_tagged_inames,
+                batch_inames=tagged_batch_inames - hw_tagged_inames)
 
-        for stmt in default_ep.instructions:
-            if isinstance(stmt, lp.MultiAssignmentBase):
-                for assignee in stmt.assignees:
-                    if not isinstance(assignee, Subscript):
-                        raise ValueError("assignees in "
-                                "FirstAxisIsElementsTag-tagged kernels must be "
-                                "subscripts")
+    # }}}
 
-                    if assignee.aggregate.name not in first_axis_el_args:
-                        continue
+    if hw_tagged_inames:
+        # The kernel has already been mapped onto hardware axes by its
+        # creator, leave it alone.
+        return _transform_identity
 
-                    subscripts = assignee.index_tuple[:2]
+    # *shrug* no idea how to transform this thing.
+    return None
 
-                    for i, subscript in enumerate(subscripts):
-                        if (not isinstance(subscript, Variable)
-                                or subscript.name not in default_ep.all_inames()):
-                            raise ValueError("subscripts in "
-                                    "FirstAxisIsElementsTag-tagged kernels must be "
-                                    "inames")
 
-                        if i == 0:
-                            el_inames.append(subscript.name)
-                        elif i == 1:
-                            dof_inames.append(subscript.name)
-        return _transform_with_element_and_dof_inames(t_unit, el_inames, dof_inames)
+def _get_constant_iname_length(t_unit, iname):
+    """Return the extent of *iname* in the default entrypoint of *t_unit*
+    if it is known at transform time, otherwise *None*.
+    """
+    try:
+        return t_unit.default_entrypoint.get_constant_iname_length(iname)
+    except LoopyError:
+        return None
 
-    # }}}
 
-    # {{{ element/dof iname tag
+# sizes of the unrolled tile of work-group-sized DOF chunks, in order of
+# preference
+_DOF_REGISTER_TILE_SIZES = (8, 4)
 
-    from meshmode.transform_metadata import (
-        ConcurrentDOFInameTag, ConcurrentElementInameTag)
-    el_inames = [iname.name
-            for iname in default_ep.inames.values()
-            if ConcurrentElementInameTag() in iname.tags]
-    dof_inames = [iname.name
-            for iname in default_ep.inames.values()
-            if ConcurrentDOFInameTag() in iname.tags]
 
-    if el_inames:
-        return _transform_with_element_and_dof_inames(t_unit, el_inames, dof_inames)
+def _get_dof_register_tile_size(ndofs, group_size):
+    if ndofs is None:
+        return None
 
-    # }}}
+    nchunks = -(-ndofs // group_size)
+    for tile in _DOF_REGISTER_TILE_SIZES:
+        # A partial tile would need a bounds check inside the unrolled loop,
+        # so only use tiles that divide the number of chunks.
+        if nchunks % tile == 0:
+            return tile
 
-    # *shrug* no idea how to transform this thing.
     return None
 
 
-def _transform_with_element_and_dof_inames(t_unit, el_inames, dof_inames):
-    import loopy as lp
+def _transform_with_element_and_dof_inames(t_unit, el_inames, dof_inames,
+        batch_inames=frozenset()):
+    """
+    :arg el_inames: an iterable of names of inames iterating over elements.
+    :arg dof_inames: an iterable of names of inames iterating over DOFs.
+    :arg batch_inames: an iterable of names of inames iterating over
+        independent instances of a batched computation, see
+        :class:`~meshmode.transform_metadata.ConcurrentBatchInameTag`.
+    """
+    el_inames = frozenset(el_inames)
+    dof_inames = frozenset(dof_inames)
+    batch_inames = frozenset(batch_inames)
 
-    if set(el_inames) & set(dof_inames):
+    if el_inames & dof_inames:
         raise ValueError("Some inames are marked as both 'element' and 'dof' "
                 "inames. These must be disjoint.")
+    if batch_inames & (el_inames | dof_inames):
+        raise ValueError("Some inames are marked as both 'batch' and "
+                "'element' or 'dof' inames. These must be disjoint.")
 
     # Sorting ensures the same order of transformations is used every
     # time; avoids accidentally generating cache misses or kernel
     # hash conflicts.
 
+    # Tags are collected and applied at once at the end, to avoid rebuilding
+    # the translation unit for each of them.
+    iname_to_tag = {}
+
     for dof_iname in sorted(dof_inames):
-        t_unit = lp.split_iname(t_unit, dof_iname, 32, inner_tag="l.0")
+        ndofs = _get_constant_iname_length(t_unit, dof_iname)
+        if ndofs is not None and ndofs <= 32:
+            # The DOFs fit into a single work group, splitting would only
+            # introduce a trivial outer loop and a bounds check.
+            iname_to_tag[dof_iname] = "l.0"
+            continue
+
+        tile = _get_dof_register_tile_size(ndofs, 32)
+
+        # Unless the outer loop is tiled further below, peel off its last
+        # (possibly partial) iteration, so that the bulk of the work groups
+        # runs without bounds checks.
+        t_unit = lp.split_iname(t_unit, dof_iname, 32,
+                slabs=(0, 1) if tile is None else (0, 0))
+        iname_to_tag[f"{dof_iname}_inner"] = "l.0"
+
+        # Unroll a short tile of the (sequential) outer DOF loop so that the
+        # per-work-item DOF values can be kept in registers.
+        if tile is not None:
+            t_unit = lp.split_iname(t_unit, f"{dof_iname}_outer", tile)
+            iname_to_tag[f"{dof_iname}_outer_inner"] = "unr"
+
     for el_iname in sorted(el_inames):
-        t_unit = lp.tag_inames(t_unit, {el_iname: "g.0"})
+        iname_to_tag[el_iname] = "g.0"
+    for batch_iname in sorted(batch_inames):
+        iname_to_tag[batch_iname] = "g.1"
+
+    if iname_to_tag:
+        t_unit = lp.tag_inames(t_unit, iname_to_tag)
+
     return t_unit
 
 # }}}
@@ -204,8 +358,7 @@ class PyOpenCLArrayContext(PyOpenCLArrayContextBase):
     """
 
     def transform_loopy_program(self, t_unit):
-        default_ep = t_unit.default_entrypoint
-        options = default_ep.options
+        options = t_unit.default_entrypoint.options
         if not (options.return_dict and options.no_numpy):
             raise ValueError("Loopy kernel passed to call_loopy must "
                     "have return_dict and no_numpy options set. "
@@ -220,7 +373,7 @@ class PyOpenCLArrayContext(PyOpenCLArrayContextBase):
         warn("meshmode.array_context.PyOpenCLArrayContext."
                 "transform_loopy_program fell back on "
                 "arraycontext.PyOpenCLArrayContext to find a transform for "
-                f"'{default_ep.name}'. "
+                f"'{t_unit.default_entrypoint.name}'. "
                 "Please update your program to use metadata from "
                 "meshmode.transform_metadata. "
                 "This code path will stop working in 2022.",
@@ -233,6 +386,43 @@ class PyOpenCLArrayContext(PyOpenCLArrayContextBase):
 
 # {{{ pytato pyopencl array context subclass
 
+def _contains_named_arrays(dag):
+    """Return *True* if any node reachable from *dag* is a
+    :class:`pytato.array.NamedArray`, such as the result of a loopy call.
+    Stops walking the graph at the first such node.
+    """
+    from pytato.array import NamedArray
+    from pytato.transform import CachedWalkMapper
+
+    class NamedArrayFound(Exception):
+        pass
+
+    class NamedArrayFinder(CachedWalkMapper):
+        def get_cache_key(self, expr):
+            return id(expr)
+
+        def get_function_definition_cache_key(self, expr):
+            return id(expr)
+
+        def visit(self, expr, *args, **kwargs):
+            if isinstance(expr, NamedArray):
+                raise NamedArrayFound()
+            return True
+
+    try:
+        NamedArrayFinder()(dag)
+    except NamedArrayFound:
+        return True
+    else:
+        return False
+
+
+@lru_cache(maxsize=8)
+def _get_untagged_axes(ndim):
+    import pytato as pt
+    return (pt.Axis(frozenset()),)*ndim
+
+
 class PytatoPyOpenCLArrayContext(PytatoPyOpenCLArrayContextBase):
     def transform_dag(self, dag):
         dag = super().transform_dag(dag)
@@ -240,12 +430,18 @@ class PytatoPyOpenCLArrayContext(PytatoPyOpenCLArrayContextBase):
         # {{{ /!\ Remove tags from NamedArrays
         # See <https://www.github.com/inducer/pytato/issues/195>
 
+        if not _contains_named_arrays(dag):
+            return dag
+
         import pytato as pt
 
         def untag_loopy_call_results(expr):
             if isinstance(expr, pt.NamedArray):
+                if not expr.tags and not any(axis.tags for axis in expr.axes):
+                    return expr
+
                 return expr.copy(tags=frozenset(),
-                                 axes=(pt.Axis(frozenset()),)*expr.ndim)
+                                 axes=_get_untagged_axes(expr.ndim))
             else:
                 return expr
 
@@ -296,7 +492,7 @@ register_pytest_array_context_factory("meshmode.pytato_cl",
 
 # {{{ handle move deprecation
 
-_actx_names = (
+_actx_names = frozenset({
         "ArrayContext",
 
         "CommonSubexpressionTag",
@@ -318,7 +514,7 @@ _actx_names = (
         "make_loopy_program",
 
         "pytest_generate_tests_for_pyopencl_array_context"
-        )
+        })
 
 
 if sys.version_info >= (3, 7):
@@ -26,6 +26,8 @@ import logging
 import numpy as np
 import numpy.linalg as la
 
+from pytools import memoize_on_first_arg
+
 from meshmode.discretization.connection.direct import InterpolationBatch
 
 
@@ -42,11 +44,32 @@ def thaw_to_numpy(actx, array):
 
 # {{{ _make_cross_face_batches
 
+def _get_bdry_nodes_as_numpy(actx, bdry_discr):
+    r"""
+    :returns: a :class:`list` containing the nodes of each group of
+        *bdry_discr*, as :class:`numpy.ndarray`\ s of shape
+        ``(ambient_dim, nelements, nunit_dofs)``.
+    """
+    nodes = bdry_discr.nodes(cached=False)
+
+    # stack on the device to only transfer once per group
+    return [
+        actx.to_numpy(actx.np.stack([actx.thaw(ary[igrp]) for ary in nodes]))
+        for igrp in range(len(bdry_discr.groups))]
+
+
 def _make_cross_face_batches(actx,
         tgt_bdry_discr, src_bdry_discr,
         i_tgt_grp, i_src_grp,
         tgt_bdry_element_indices, src_bdry_element_indices,
-        tgt_aff_map=None, src_aff_map=None):
+        tgt_aff_map=None, src_aff_map=None,
+        tgt_bdry_nodes=None, src_bdry_nodes=None):
+    """
+    :arg tgt_bdry_nodes: if given, the result of :func:`_get_bdry_nodes_as_numpy`
+        for *tgt_bdry_discr*, to avoid recomputing (and transferring) the
+        nodes for every call.
+    :arg src_bdry_nodes: same as *tgt_bdry_nodes*, for *src_bdry_discr*.
+    """
 
     if tgt_bdry_discr.dim == 0:
         return [InterpolationBatch(
@@ -64,15 +87,15 @@ def _make_cross_face_batches(actx,
     if src_aff_map is None:
         src_aff_map = AffineMap()
 
-    tgt_bdry_nodes = tgt_aff_map(np.array([
-        thaw_to_numpy(actx, ary[i_tgt_grp])[tgt_bdry_element_indices]
-        for ary in tgt_bdry_discr.nodes(cached=False)
-        ]))
+    if tgt_bdry_nodes is None:
+        tgt_bdry_nodes = _get_bdry_nodes_as_numpy(actx, tgt_bdry_discr)
+    if src_bdry_nodes is None:
+        src_bdry_nodes = _get_bdry_nodes_as_numpy(actx, src_bdry_discr)
 
-    src_bdry_nodes = src_aff_map(np.array([
-        thaw_to_numpy(actx, ary[i_src_grp])[src_bdry_element_indices]
-        for ary in src_bdry_discr.nodes(cached=False)
-        ]))
+    tgt_bdry_nodes = tgt_aff_map(
+            tgt_bdry_nodes[i_tgt_grp][:, tgt_bdry_element_indices])
+    src_bdry_nodes = src_aff_map(
+            src_bdry_nodes[i_src_grp][:, src_bdry_element_indices])
 
     tol = 1e4 * np.finfo(tgt_bdry_nodes.dtype).eps
 
@@ -83,12 +106,17 @@ def _make_cross_face_batches(actx,
             tgt_bdry_nodes=tgt_bdry_nodes,
             src_bdry_nodes=src_bdry_nodes,
             src_grp=src_grp, tol=tol)
+    if src_unit_nodes is None and src_mesh_grp.is_affine:
+        src_unit_nodes = _find_src_unit_nodes_via_affine_map(
+            tgt_bdry_nodes=tgt_bdry_nodes,
+            src_bdry_nodes=src_bdry_nodes,
+            src_grp=src_grp, src_mesh_grp=src_mesh_grp,
+            tol=tol)
     if src_unit_nodes is None:
         src_unit_nodes = _find_src_unit_nodes_via_gauss_newton(
             tgt_bdry_nodes=tgt_bdry_nodes,
             src_bdry_nodes=src_bdry_nodes,
             src_grp=src_grp, src_mesh_grp=src_mesh_grp,
-            tgt_bdry_discr=tgt_bdry_discr, src_bdry_discr=src_bdry_discr,
             tol=tol)
 
     return list(_find_src_unit_nodes_batches(
@@ -103,10 +131,7 @@ def _make_cross_face_batches(actx,
 
 # {{{ _find_src_unit_nodes_by_matching
 
-def _find_src_unit_nodes_by_matching(
-        tgt_bdry_nodes,
-        src_bdry_nodes,
-        src_grp, tol):
+def _find_src_node_indices_dense(tgt_bdry_nodes, src_bdry_nodes, tol):
     ambient_dim, nelements, ntgt_unit_nodes = tgt_bdry_nodes.shape
 
     dist_vecs = (tgt_bdry_nodes.reshape(ambient_dim, nelements, -1, 1)
@@ -119,16 +144,76 @@ def _find_src_unit_nodes_by_matching(
     if not (num_close_vertices == 1).all():
         return None
 
-    # Success: it's just a permutation
-    source_indices = np.where(is_close)[-1].reshape(nelements, ntgt_unit_nodes)
+    return np.where(is_close)[-1].reshape(nelements, ntgt_unit_nodes)
+
+
+def _find_src_node_indices_kdtree(tgt_bdry_nodes, src_bdry_nodes, tol):
+    from scipy.spatial import cKDTree  # pylint: disable=no-name-in-module
+
+    ambient_dim, nelements, ntgt_unit_nodes = tgt_bdry_nodes.shape
+    _, _, nsrc_unit_nodes = src_bdry_nodes.shape
+
+    # Append the element number as an additional coordinate, spaced so that
+    # nodes of different elements are always further than *tol* apart. This
+    # lets a single tree handle all elements.
+    el_coordinate = 2*tol*np.arange(nelements, dtype=src_bdry_nodes.dtype)
+
+    def make_points(nodes):
+        _, _, nnodes = nodes.shape
+        return np.concatenate([
+            nodes.transpose(1, 2, 0).reshape(-1, ambient_dim),
+            np.repeat(el_coordinate, nnodes).reshape(-1, 1)
+            ], axis=1)
+
+    # Balancing the tree and compacting its nodes speeds up queries at the
+    # expense of the build, which does not pay off for a single query.
+    tree = cKDTree(make_points(src_bdry_nodes), leafsize=16,
+            balanced_tree=False, compact_nodes=False)
+
+    # Query two neighbors to make sure that the match is unique. Neighbors
+    # further away than *tol* are irrelevant, bounding the search by it
+    # prunes most of the tree.
+    dists, indices = tree.query(make_points(tgt_bdry_nodes), k=2,
+            distance_upper_bound=tol)
+    if not ((dists[:, 0] < tol).all() and (dists[:, 1] >= tol).all()):
+        return None
+
+    src_el_indices, source_indices = np.divmod(
+            indices[:, 0].reshape(nelements, ntgt_unit_nodes), nsrc_unit_nodes)
+    assert (src_el_indices == np.arange(nelements).reshape(-1, 1)).all()
+
+    return source_indices
+
+
+# The dense comparison needs memory and time quadratic in the number of nodes
+# per face, but is faster than building and querying a tree for small counts.
+_MAX_NODES_FOR_DENSE_MATCHING = 32
 
-    # check
-    matched_src_bdry_nodes = src_bdry_nodes[
-            :, np.arange(nelements).reshape(-1, 1), source_indices]
-    dist_vecs = tgt_bdry_nodes - matched_src_bdry_nodes
-    is_close = la.norm(dist_vecs, axis=0, ord=2) < tol
-    assert is_close.all()
 
+def _find_src_unit_nodes_by_matching(
+        tgt_bdry_nodes,
+        src_bdry_nodes,
+        src_grp, tol):
+    _, _, nsrc_unit_nodes = src_bdry_nodes.shape
+
+    use_kdtree = nsrc_unit_nodes > _MAX_NODES_FOR_DENSE_MATCHING
+    if use_kdtree:
+        try:
+            import scipy.spatial  # noqa: F401
+        except ImportError:
+            use_kdtree = False
+
+    if use_kdtree:
+        source_indices = _find_src_node_indices_kdtree(
+                tgt_bdry_nodes, src_bdry_nodes, tol)
+    else:
+        source_indices = _find_src_node_indices_dense(
+                tgt_bdry_nodes, src_bdry_nodes, tol)
+
+    if source_indices is None:
+        return None
+
+    # Success: it's just a permutation
     return src_grp.unit_nodes[:, source_indices]
 
 # }}}
@@ -136,165 +221,305 @@ def _find_src_unit_nodes_by_matching(
 
 # {{{ _find_src_unit_nodes_via_gauss_newton
 
-def _find_src_unit_nodes_via_gauss_newton(
-        tgt_bdry_nodes,
-        src_bdry_nodes,
-        src_grp, src_mesh_grp,
-        tgt_bdry_discr, src_bdry_discr,
-        tol):
-    dim = src_grp.dim
-    _, nelements, ntgt_unit_nodes = tgt_bdry_nodes.shape
+@memoize_on_first_arg
+def _get_inverse_transposed_vandermonde(grp):
+    import modepy as mp
+    vdm = mp.vandermonde(grp.basis_obj().functions, grp.unit_nodes)
+    return la.inv(vdm.T)
 
-    initial_guess = np.mean(src_mesh_grp.vertex_unit_coordinates(), axis=0)
-    src_unit_nodes = np.empty((dim, nelements, ntgt_unit_nodes))
-    src_unit_nodes[:] = initial_guess.reshape(-1, 1, 1)
 
+@memoize_on_first_arg
+def _get_monomial_exponents_and_inverse_transposed_vandermonde(grp):
     import modepy as mp
-    src_grp_basis_fcts = src_grp.basis_obj().functions
-    vdm = mp.vandermonde(src_grp_basis_fcts, src_grp.unit_nodes)
-    inv_t_vdm = la.inv(vdm.T)
-    nsrc_funcs = len(src_grp_basis_fcts)
+    basis = mp.monomial_basis_for_space(grp.space, grp.shape)
+    exponents = np.array(basis.mode_ids, dtype=np.int64).reshape(-1, grp.dim)
 
-    def apply_map(unit_nodes):
-        # unit_nodes: (dim, nelements, ntgt_unit_nodes)
+    vdm = mp.vandermonde(basis.functions, grp.unit_nodes)
+    return exponents, la.inv(vdm.T)
 
-        # basis_at_unit_nodes
-        basis_at_unit_nodes = np.empty((nsrc_funcs, nelements, ntgt_unit_nodes))
 
-        for i, f in enumerate(src_grp_basis_fcts):
-            basis_at_unit_nodes[i] = (
-                    f(unit_nodes.reshape(dim, -1))
-                    .reshape(nelements, ntgt_unit_nodes))
+def _evaluate_monomials(exponents, unit_nodes, with_gradients=True):
+    """
+    :arg exponents: an integer array of shape ``(nmonomials, dim)``.
+    :arg unit_nodes: an array of shape ``(dim, nnodes)``.
+    :returns: an array of shape ``(1 + dim, nmonomials, nnodes)`` containing
+        the values of the monomials (at index 0) and of their derivatives
+        along each unit axis. Without *with_gradients*, only the values are
+        returned, in an array of shape ``(1, nmonomials, nnodes)``.
+    """
+    dim, nnodes = unit_nodes.shape
+    dtype = unit_nodes.dtype
 
-        intp_coeffs = np.einsum("fj,jet->fet", inv_t_vdm, basis_at_unit_nodes)
+    # powers[i, k] = unit_nodes[i] ** k
+    powers = np.empty((dim, np.max(exponents, initial=0) + 1, nnodes), dtype)
+    powers[:, 0] = 1
+    for k in range(1, powers.shape[1]):
+        powers[:, k] = powers[:, k - 1] * unit_nodes
 
-        # If we're interpolating 1, we had better get 1 back.
-        one_deviation = np.abs(np.sum(intp_coeffs, axis=0) - 1)
-        assert (one_deviation < tol).all(), np.max(one_deviation)
+    factors = [powers[i, exponents[:, i]] for i in range(dim)]
 
-        mapped = np.einsum("fet,aef->aet", intp_coeffs, src_bdry_nodes)
-        assert tgt_bdry_nodes.shape == mapped.shape
-        return mapped
+    result = np.empty(
+            (1 + dim if with_gradients else 1, len(exponents), nnodes), dtype)
+    result[0] = np.prod(factors, axis=0)
 
-    def get_map_jacobian(unit_nodes):
-        # unit_nodes: (dim, nelements, ntgt_unit_nodes)
+    if with_gradients:
+        for i in range(dim):
+            dfactor = (
+                    exponents[:, i, np.newaxis].astype(dtype)
+                    * powers[i, np.maximum(exponents[:, i] - 1, 0)])
+            result[1 + i] = np.prod(
+                    factors[:i] + [dfactor] + factors[i + 1:], axis=0)
 
-        # basis_at_unit_nodes
-        dbasis_at_unit_nodes = np.empty(
-                (dim, nsrc_funcs, nelements, ntgt_unit_nodes))
+    return result
 
-        for i, df in enumerate(src_grp.basis_obj().gradients):
-            df_result = df(unit_nodes.reshape(dim, -1))
 
-            for rst_axis, df_r in enumerate(df_result):
-                dbasis_at_unit_nodes[rst_axis, i] = (
-                        df_r.reshape(nelements, ntgt_unit_nodes))
+def _find_src_unit_nodes_via_affine_map(
+        tgt_bdry_nodes,
+        src_bdry_nodes,
+        src_grp, src_mesh_grp,
+        tol):
+    """For affinely mapped source elements, the Jacobian of the map is constant
+    on each element, so the reference coordinates of the target nodes can be
+    found directly, without iterating.
 
-        dintp_coeffs = np.einsum(
-                "fj,rjet->rfet", inv_t_vdm, dbasis_at_unit_nodes)
+    :returns: *None* if the target nodes are not recovered to within *tol*.
+    """
+    dim = src_grp.dim
 
-        return np.einsum("rfet,aef->raet", dintp_coeffs, src_bdry_nodes)
+    center = np.mean(src_mesh_grp.vertex_unit_coordinates(), axis=0)
+    flat_center = center.reshape(dim, 1)
+
+    src_grp_basis = src_grp.basis_obj()
+    inv_t_vdm = _get_inverse_transposed_vandermonde(src_grp)
+    nsrc_funcs = len(src_grp_basis.functions)
+
+    # basis_at_center[0]: values of the basis functions
+    # basis_at_center[1:]: their derivatives along each unit axis
+    basis_at_center = np.empty((1 + dim, nsrc_funcs, 1))
+    for i, (f, df) in enumerate(
+            zip(src_grp_basis.functions, src_grp_basis.gradients)):
+        basis_at_center[0, i] = f(flat_center)
+        for rst_axis, df_r in enumerate(df(flat_center)):
+            basis_at_center[1 + rst_axis, i] = df_r
+
+    # shape: (1 + dim, ambient_dim, nelements)
+    map_and_jacobian = np.einsum("rj,fj,aef->rae",
+            basis_at_center[:, :, 0], inv_t_vdm, src_bdry_nodes,
+            optimize=True)
+    mapped_center = map_and_jacobian[0, :, :, np.newaxis]
+    df = map_and_jacobian[1:]
+
+    # Solve the (per-element) normal equations for the offsets from the center.
+    ata = np.einsum("iae,jae->eij", df, df)
+    atb = np.einsum("iae,aet->eit", df, tgt_bdry_nodes - mapped_center)
+    unit_offsets = np.linalg.solve(ata, atb).transpose(1, 0, 2)
+
+    resid = (mapped_center
+            + np.einsum("iae,iet->aet", df, unit_offsets)
+            - tgt_bdry_nodes)
+    if np.max(np.abs(resid), initial=0) >= tol:
+        return None
 
-    # {{{ test map applier and jacobian
+    return unit_offsets + center.reshape(-1, 1, 1)
 
-    if 0:
-        u = src_unit_nodes
-        f = apply_map(u)
-        for h in [1e-1, 1e-2]:
-            du = h*np.random.randn(*u.shape)
 
-            f_2 = apply_map(u+du)
+def _find_src_unit_nodes_via_gauss_newton(
+        tgt_bdry_nodes,
+        src_bdry_nodes,
+        src_grp, src_mesh_grp,
+        tol):
+    dim = src_grp.dim
+    _, nelements, ntgt_unit_nodes = tgt_bdry_nodes.shape
 
-            jf = get_map_jacobian(u)
+    initial_guess = np.mean(src_mesh_grp.vertex_unit_coordinates(), axis=0)
+    src_unit_nodes = np.empty((dim, nelements, ntgt_unit_nodes))
+    src_unit_nodes[:] = initial_guess.reshape(-1, 1, 1)
 
-            f2_2 = f + np.einsum("raet,ret->aet", jf, du)
+    src_grp_basis_fcts = src_grp.basis_obj().functions
+    inv_t_vdm = _get_inverse_transposed_vandermonde(src_grp)
+    nsrc_funcs = len(src_grp_basis_fcts)
 
-            print(h, la.norm((f_2-f2_2).ravel()))
+    # Rather than interpolating from the source nodes at every iteration,
+    # express the map (and the constant function, for the sanity check
+    # below) in terms of the basis functions once, so that each iteration
+    # only needs to contract the basis function values with these
+    # coefficients.
+    # shape: (ambient_dim, nelements, nsrc_funcs)
+    src_bdry_modes = np.einsum("fj,aef->aej", inv_t_vdm, src_bdry_nodes)
+    # shape: (nsrc_funcs,)
+    one_modes = np.sum(inv_t_vdm, axis=0)
+
+    # The shape of the contraction below does not change between iterations,
+    # so find its contraction path once.
+    map_and_jacobian_path, _ = np.einsum_path("rjet,aej->raet",
+            np.empty((1 + dim, nsrc_funcs, nelements, ntgt_unit_nodes)),
+            src_bdry_modes, optimize="optimal")
+
+    src_grp_basis_grads = src_grp.basis_obj().gradients
+
+    # In single precision, the map is instead expressed in terms of monomials,
+    # which are much cheaper to evaluate (all at once) than the basis
+    # functions. Their ill-conditioning at higher orders does not matter at
+    # that precision.
+    monomial_exponents, inv_t_monomial_vdm = \
+            _get_monomial_exponents_and_inverse_transposed_vandermonde(src_grp)
+    # shape: (ambient_dim, nelements, nmonomials)
+    single_src_bdry_monomial_coeffs = np.einsum("fj,aef->aej",
+            inv_t_monomial_vdm, src_bdry_nodes).astype(np.float32)
+
+    def apply_map_and_jacobian(unit_nodes,
+            with_jacobian=True, check_partition_of_unity=False):
+        # unit_nodes: (dim, nelements, ntgt_unit_nodes)
+        flat_unit_nodes = unit_nodes.reshape(dim, -1)
+        nrows = 1 + dim if with_jacobian else 1
+
+        # basis_at_unit_nodes[0]: values of the basis functions
+        # basis_at_unit_nodes[1:]: their derivatives along each unit axis
+        if unit_nodes.dtype == np.float32:
+            basis_at_unit_nodes = _evaluate_monomials(
+                    monomial_exponents, flat_unit_nodes,
+                    with_gradients=with_jacobian)
+            coeffs = single_src_bdry_monomial_coeffs
+        else:
+            basis_at_unit_nodes = np.empty(
+                    (nrows, nsrc_funcs, nelements * ntgt_unit_nodes),
+                    dtype=unit_nodes.dtype)
 
-    # }}}
+            for i, (f, df) in enumerate(
+                    zip(src_grp_basis_fcts, src_grp_basis_grads)):
+                basis_at_unit_nodes[0, i] = f(flat_unit_nodes)
+                if with_jacobian:
+                    for rst_axis, df_r in enumerate(df(flat_unit_nodes)):
+                        basis_at_unit_nodes[1 + rst_axis, i] = df_r
 
-    # {{{ visualize initial guess
+            coeffs = src_bdry_modes.astype(unit_nodes.dtype, copy=False)
 
-    if 0:
-        import matplotlib.pyplot as pt
-        guess = apply_map(src_unit_nodes)
-        goals = tgt_bdry_nodes
+        basis_at_unit_nodes = basis_at_unit_nodes.reshape(
+                nrows, -1, nelements, ntgt_unit_nodes)
 
-        from meshmode.discretization.visualization import draw_curve
-        pt.figure(0)
-        draw_curve(tgt_bdry_discr)
-        pt.figure(1)
-        draw_curve(src_bdry_discr)
-        pt.figure(2)
+        if check_partition_of_unity:
+            # If we're interpolating 1, we had better get 1 back.
+            one_deviation = np.abs(
+                    np.einsum("j,jet->et", one_modes, basis_at_unit_nodes[0]) - 1)
+            assert (one_deviation < tol).all(), np.max(one_deviation)
 
-        pt.plot(guess[0].reshape(-1), guess[1].reshape(-1), "or")
-        pt.plot(goals[0].reshape(-1), goals[1].reshape(-1), "og")
-        pt.plot(src_bdry_nodes[0].reshape(-1), src_bdry_nodes[1].reshape(-1), "xb")
-        pt.show()
+        mapped_and_jacobian = np.einsum("rjet,aej->raet",
+                basis_at_unit_nodes, coeffs,
+                optimize=map_and_jacobian_path)
 
-    # }}}
+        mapped = mapped_and_jacobian[0]
+        assert tgt_bdry_nodes.shape == mapped.shape
+        return mapped, (mapped_and_jacobian[1:] if with_jacobian else None)
 
     logger.debug("_find_src_unit_nodes_via_gauss_newton: begin")
 
+    # Most of the iterations are spent getting close to the solution, for
+    # which single precision is sufficient (and cheaper, mostly for evaluating
+    # the basis functions). Only the last few iterations are done in the
+    # precision of the nodes.
+    single_precision = tgt_bdry_nodes.dtype == np.float64
+    if single_precision:
+        single_tol = 1e2 * np.finfo(np.float32).eps * max(
+                1, np.max(np.abs(tgt_bdry_nodes)))
+        src_unit_nodes = src_unit_nodes.astype(np.float32)
+        working_tgt_bdry_nodes = tgt_bdry_nodes.astype(np.float32)
+    else:
+        working_tgt_bdry_nodes = tgt_bdry_nodes
+
+    def make_cramer_buffers():
+        # buffers for Cramer's rule below, to avoid allocating temporaries
+        # in every iteration
+        return (
+                np.empty((nelements, ntgt_unit_nodes), src_unit_nodes.dtype),
+                np.empty((nelements, ntgt_unit_nodes), src_unit_nodes.dtype),
+                np.empty_like(src_unit_nodes))
+
+    if dim == 2:
+        inv_det, cramer_tmp, df_inv_resid = make_cramer_buffers()
+
     niter = 0
+    max_step = np.inf
     while True:
-        resid = apply_map(src_unit_nodes) - tgt_bdry_nodes
+        # Once the steps get small, the Jacobian barely changes, so keep using
+        # the previous one (i.e. do chord iterations) rather than reevaluating
+        # the basis function derivatives.
+        with_jacobian = max_step >= np.sqrt(tol)
+
+        # The partition-of-unity sanity check does not depend on the
+        # iterate, so it is only done once.
+        mapped, new_df = apply_map_and_jacobian(src_unit_nodes,
+                with_jacobian=with_jacobian,
+                check_partition_of_unity=(
+                    __debug__ and not single_precision and niter == 0))
+        resid = mapped - working_tgt_bdry_nodes
+
+        # We'll use the normal equations, and Cramer's rule for the 1D/2D
+        # accelerated versions. If you're looking for high-end numerics, look
+        # no further than meshmode.
+
+        # A is df.T
+        #
+        # NOTE: The (large) element and node axes are kept last here, so
+        # that these are vectorized over them. Batched matmul/solve over
+        # the tiny (dim, ambient_dim) systems is several times slower.
+        if with_jacobian:
+            df = new_df
+            ata = np.einsum("iket,jket->ijet", df, df)
 
-        df = get_map_jacobian(src_unit_nodes)
-        df_inv_resid = np.empty_like(src_unit_nodes)
+            if dim == 2:
+                np.multiply(ata[0, 0], ata[1, 1], out=inv_det)
+                np.multiply(ata[0, 1], ata[1, 0], out=cramer_tmp)
+                np.subtract(inv_det, cramer_tmp, out=inv_det)
+                np.reciprocal(inv_det, out=inv_det)
 
-        # For the 1D/2D accelerated versions, we'll use the normal
-        # equations and Cramer's rule. If you're looking for high-end
-        # numerics, look no further than meshmode.
+        atb = np.einsum("iket,ket->iet", df, resid)
 
         if dim == 1:
-            # A is df.T
-            ata = np.einsum("iket,jket->ijet", df, df)
-            atb = np.einsum("iket,ket->iet", df, resid)
-
             df_inv_resid = atb / ata[0, 0]
 
         elif dim == 2:
-            # A is df.T
-            ata = np.einsum("iket,jket->ijet", df, df)
-            atb = np.einsum("iket,ket->iet", df, resid)
-
-            det = ata[0, 0]*ata[1, 1] - ata[0, 1]*ata[1, 0]
-
-            df_inv_resid = np.empty_like(src_unit_nodes)
-            df_inv_resid[0] = 1/det * (ata[1, 1] * atb[0] - ata[1, 0]*atb[1])
-            df_inv_resid[1] = 1/det * (-ata[0, 1] * atb[0] + ata[0, 0]*atb[1])
+            # df_inv_resid[0] = 1/det * (ata[1, 1]*atb[0] - ata[1, 0]*atb[1])
+            np.multiply(ata[1, 1], atb[0], out=df_inv_resid[0])
+            np.multiply(ata[1, 0], atb[1], out=cramer_tmp)
+            np.subtract(df_inv_resid[0], cramer_tmp, out=df_inv_resid[0])
+            np.multiply(df_inv_resid[0], inv_det, out=df_inv_resid[0])
+
+            # df_inv_resid[1] = 1/det * (ata[0, 0]*atb[1] - ata[0, 1]*atb[0])
+            np.multiply(ata[0, 0], atb[1], out=df_inv_resid[1])
+            np.multiply(ata[0, 1], atb[0], out=cramer_tmp)
+            np.subtract(df_inv_resid[1], cramer_tmp, out=df_inv_resid[1])
+            np.multiply(df_inv_resid[1], inv_det, out=df_inv_resid[1])
 
         else:
             # The boundary of a 3D mesh is 2D, so that's the
-            # highest-dimensional case we genuinely care about.
-            #
-            # This stinks, performance-wise, because it's not vectorized.
-            # But we'll only hit it for boundaries of 4+D meshes, in which
-            # case... good luck. :)
-            for e in range(nelements):
-                for t in range(ntgt_unit_nodes):
-                    df_inv_resid[:, e, t], _, _, _ = \
-                            la.lstsq(df[:, :, e, t].T, resid[:, e, t])
+            # highest-dimensional case we genuinely care about. For the
+            # boundaries of 4+D meshes, solve all the (small) systems at once.
+            df_inv_resid = np.linalg.solve(
+                    ata.transpose(2, 3, 0, 1),
+                    atb.transpose(1, 2, 0)[..., np.newaxis]
+                    )[..., 0].transpose(2, 0, 1)
 
         src_unit_nodes = src_unit_nodes - df_inv_resid
+        max_step = np.max(np.abs(df_inv_resid))
 
-        # {{{ visualize next guess
+        max_resid = np.max(np.abs(resid))
 
-        if 0:
-            import matplotlib.pyplot as pt
-            guess = apply_map(src_unit_nodes)
-            goals = tgt_bdry_nodes
+        if single_precision:
+            if max_resid < single_tol or niter >= 5:
+                logger.debug("_find_src_unit_nodes_via_gauss_newton: "
+                        "switching to double precision, residual: %g", max_resid)
 
-            pt.plot(guess[0].reshape(-1), guess[1].reshape(-1), "rx")
-            pt.plot(goals[0].reshape(-1), goals[1].reshape(-1), "go")
-            pt.show()
+                single_precision = False
+                src_unit_nodes = src_unit_nodes.astype(tgt_bdry_nodes.dtype)
+                working_tgt_bdry_nodes = tgt_bdry_nodes
+                if dim == 2:
+                    inv_det, cramer_tmp, df_inv_resid = make_cramer_buffers()
 
-        # }}}
+                niter = 0
+                max_step = np.inf
+                continue
 
-        max_resid = np.max(np.abs(resid))
-
-        if max_resid < tol:
+        elif max_resid < tol:
             logger.debug("_find_src_unit_nodes_via_gauss_newton: done, "
                     "final residual: %g", max_resid)
             return src_unit_nodes
@@ -315,31 +540,68 @@ def _find_src_unit_nodes_batches(
         actx, src_unit_nodes, i_src_grp,
         tgt_bdry_element_indices, src_bdry_element_indices,
         tol):
-    dim, nelements, _ = src_unit_nodes.shape
-
-    done_elements = np.zeros(nelements, dtype=bool)
-    while True:
-        todo_elements, = np.where(~done_elements)
-        if not len(todo_elements):
-            return
-
-        template_unit_nodes = src_unit_nodes[:, todo_elements[0], :]
-
-        unit_node_dist = np.max(np.max(np.abs(
-                src_unit_nodes[:, todo_elements, :]
-                - template_unit_nodes.reshape(dim, 1, -1)),
-                axis=2), axis=0)
-
-        close_els = todo_elements[unit_node_dist < tol]
-        done_elements[close_els] = True
+    _, nelements, _ = src_unit_nodes.shape
+    if nelements == 0:
+        return
+
+    def unit_node_dist(elements, template_element):
+        return np.max(np.abs(
+                src_unit_nodes[:, elements, :]
+                - src_unit_nodes[:, template_element, np.newaxis, :]),
+                axis=(0, 2))
+
+    # Elements whose unit nodes agree to within *tol* share a batch. Quantizing
+    # the unit nodes and sorting the elements by the resulting signatures
+    # yields runs of elements with equal signatures, which are candidates for
+    # a batch. Unit nodes that agree to within *tol* may still straddle a
+    # rounding boundary, so the runs are assigned to batches by comparing them
+    # to the batch templates with the same tolerance as a pairwise search.
+    # There are usually only a handful of runs and batches.
+    signatures = (np.round(src_unit_nodes / tol).astype(np.int64)
+            .transpose(1, 0, 2).reshape(nelements, -1))
+    sorted_elements = np.lexsort(signatures.T)
+
+    sorted_signatures = signatures[sorted_elements]
+    run_starts, = np.nonzero(
+        np.any(sorted_signatures[1:] != sorted_signatures[:-1], axis=1))
+
+    # Visit the runs in order of their lowest element number (lexsort is
+    # stable, so that is the first one), which makes the templates the same
+    # as those of a pairwise search.
+    runs = sorted(np.split(sorted_elements, run_starts + 1), key=lambda r: r[0])
+
+    template_elements = []
+    batch_elements = []
+    for run_elements in runs:
+        for ibatch, template_element in enumerate(template_elements):
+            if not run_elements.size:
+                break
+
+            is_close = unit_node_dist(run_elements, template_element) < tol
+            batch_elements[ibatch].append(run_elements[is_close])
+            run_elements = run_elements[~is_close]
+
+        while run_elements.size:
+            template_element = run_elements[0]
+
+            is_close = unit_node_dist(run_elements, template_element) < tol
+            template_elements.append(template_element)
+            batch_elements.append([run_elements[is_close]])
+            run_elements = run_elements[~is_close]
+
+    batch_elements = [np.sort(np.concatenate(els)) for els in batch_elements]
+
+    # emit batches in order of their first element
+    for ibatch in np.argsort([els[0] for els in batch_elements]):
+        els = batch_elements[ibatch]
 
         yield InterpolationBatch(
                 from_group_index=i_src_grp,
                 from_element_indices=freeze_from_numpy(
-                    actx, src_bdry_element_indices[close_els]),
+                    actx, src_bdry_element_indices[els]),
                 to_element_indices=freeze_from_numpy(
-                    actx, tgt_bdry_element_indices[close_els]),
-                result_unit_nodes=template_unit_nodes,
+                    actx, tgt_bdry_element_indices[els]),
+                result_unit_nodes=src_unit_nodes[:, template_elements[ibatch], :],
                 to_element_face=None)
 
 # }}}
@@ -369,10 +631,21 @@ def _make_bdry_el_lookup_table(actx, connection, igrp):
     iel_lookup = np.full((from_nelements, from_nfaces), -1,
             dtype=connection.from_discr.mesh.element_id_dtype)
 
-    for batch in connection.groups[igrp].batches:
-        from_element_indices = thaw_to_numpy(actx, batch.from_element_indices)
-        iel_lookup[from_element_indices, batch.to_element_face] = \
-                thaw_to_numpy(actx, batch.to_element_indices)
+    batches = connection.groups[igrp].batches
+    if not batches:
+        return iel_lookup
+
+    # Transfer all the element indices in one go, rather than two per batch.
+    from_element_indices, to_element_indices = np.split(
+            actx.to_numpy(actx.np.concatenate(
+                [actx.thaw(batch.from_element_indices) for batch in batches]
+                + [actx.thaw(batch.to_element_indices) for batch in batches])),
+            2)
+    to_element_faces = np.repeat(
+            [batch.to_element_face for batch in batches],
+            [batch.nelements for batch in batches])
+
+    iel_lookup[from_element_indices, to_element_faces] = to_element_indices
 
     return iel_lookup
 
@@ -407,6 +680,10 @@ def make_opposite_face_connection(actx, volume_to_bdry_conn):
     # a list of batches for each group
     groups = [[] for i_tgt_grp in range(ngrps)]
 
+    bdry_nodes = (
+            _get_bdry_nodes_as_numpy(actx, bdry_discr)
+            if bdry_discr.dim > 0 else None)
+
     for i_src_grp in range(ngrps):
         src_grp_el_lookup = _make_bdry_el_lookup_table(
                 actx, volume_to_bdry_conn, i_src_grp)
@@ -420,8 +697,18 @@ def make_opposite_face_connection(actx, volume_to_bdry_conn):
                 if isinstance(adj, InteriorAdjacencyGroup)
                 and adj.ineighbor_group == i_src_grp]
 
+            nfaces_tgt = vol_mesh.groups[i_tgt_grp].nfaces
+
             for adj in adj_grps:
-                for i_face_tgt in range(vol_mesh.groups[i_tgt_grp].nfaces):
+                # bucket the adjacency entries by face (keeping their order
+                # within each face)
+                adj_face_order = np.argsort(adj.element_faces, kind="stable")
+                adj_face_bounds = np.searchsorted(
+                        adj.element_faces[adj_face_order], np.arange(nfaces_tgt + 1))
+                adj_face_starts = adj_face_bounds[:-1]
+                adj_face_ends = adj_face_bounds[1:]
+
+                for i_face_tgt in range(nfaces_tgt):
                     vbc_tgt_grp_face_batch = _find_ibatch_for_face(
                             vbc_tgt_grp_batches, i_face_tgt)
 
@@ -434,8 +721,9 @@ def make_opposite_face_connection(actx, volume_to_bdry_conn):
                     # there will be separate adjacency groups for intra- and
                     # inter-group connections.
 
-                    adj_tgt_flags = adj.element_faces == i_face_tgt
-                    adj_els = adj.elements[adj_tgt_flags]
+                    adj_tgt_indices = adj_face_order[
+                            adj_face_starts[i_face_tgt]:adj_face_ends[i_face_tgt]]
+                    adj_els = adj.elements[adj_tgt_indices]
                     if adj_els.size == 0:
                         # NOTE: this case can happen for inter-group boundaries
                         # when all elements are adjacent on the same face
@@ -452,10 +740,27 @@ def make_opposite_face_connection(actx, volume_to_bdry_conn):
 
                     else:
                         # Genuine subset: figure out an index mapping.
-                        vbc_els_sort_idx = np.argsort(vbc_els)
-                        vbc_used_els = vbc_els_sort_idx[np.searchsorted(
-                            vbc_els, adj_els, sorter=vbc_els_sort_idx
-                            )]
+                        vbc_els_max = np.max(vbc_els, initial=-1)
+                        if vbc_els_max < 8 * len(vbc_els):
+                            # element numbers are dense enough for a lookup table
+                            vbc_els_inv = np.full(vbc_els_max + 1, -1,
+                                    dtype=np.intp)
+                            vbc_els_inv[vbc_els] = np.arange(len(vbc_els))
+
+                            assert (
+                                np.min(adj_els) >= 0
+                                and np.max(adj_els) <= vbc_els_max), (
+                                    "adjacent elements out of range of the "
+                                    "volume-to-boundary connection elements")
+                            vbc_used_els = vbc_els_inv[adj_els]
+                            assert (vbc_used_els >= 0).all(), (
+                                    "adjacent elements not found among the "
+                                    "volume-to-boundary connection elements")
+                        else:
+                            vbc_els_sort_idx = np.argsort(vbc_els)
+                            vbc_used_els = vbc_els_sort_idx[np.searchsorted(
+                                vbc_els, adj_els, sorter=vbc_els_sort_idx
+                                )]
 
                     assert np.array_equal(vbc_els[vbc_used_els], adj_els)
 
@@ -468,46 +773,22 @@ def make_opposite_face_connection(actx, volume_to_bdry_conn):
 
                     # find src_bdry_element_indices
 
-                    src_vol_element_indices = adj.neighbors[adj_tgt_flags]
-                    src_element_faces = adj.neighbor_faces[adj_tgt_flags]
+                    src_vol_element_indices = adj.neighbors[adj_tgt_indices]
+                    src_element_faces = adj.neighbor_faces[adj_tgt_indices]
 
                     src_bdry_element_indices = src_grp_el_lookup[
                             src_vol_element_indices, src_element_faces]
 
                     # }}}
 
-                    # {{{ visualization (for debugging)
-
-                    if 0:
-                        print("TVE", adj.elements[adj_tgt_flags])
-                        print("TBE", tgt_bdry_element_indices)
-                        print("FVE", src_vol_element_indices)
-                        import matplotlib.pyplot as pt
-
-                        from meshmode.mesh.visualization import draw_2d_mesh
-                        draw_2d_mesh(vol_discr.mesh, draw_element_numbers=True,
-                                set_bounding_box=True,
-                                draw_vertex_numbers=False,
-                                draw_face_numbers=True,
-                                fill=None)
-                        pt.figure()
-
-                        draw_2d_mesh(bdry_discr.mesh, draw_element_numbers=True,
-                                set_bounding_box=True,
-                                draw_vertex_numbers=False,
-                                draw_face_numbers=True,
-                                fill=None)
-
-                        pt.show()
-
-                    # }}}
-
                     batches = _make_cross_face_batches(actx,
                             bdry_discr, bdry_discr,
                             i_tgt_grp, i_src_grp,
                             tgt_bdry_element_indices,
                             src_bdry_element_indices,
-                            tgt_aff_map=adj.aff_map)
+                            tgt_aff_map=adj.aff_map,
+                            tgt_bdry_nodes=bdry_nodes,
+                            src_bdry_nodes=bdry_nodes)
                     groups[i_tgt_grp].extend(batches)
 
     from meshmode.discretization.connection import (
@@ -556,6 +837,13 @@ def make_partition_connection(actx, *, local_bdry_conn,
 
     assert len(local_vol_groups) == len(local_bdry_conn.to_discr.groups)
 
+    if remote_bdry_discr.dim > 0:
+        local_bdry_nodes = _get_bdry_nodes_as_numpy(
+                actx, local_bdry_conn.to_discr)
+        remote_bdry_nodes = _get_bdry_nodes_as_numpy(actx, remote_bdry_discr)
+    else:
+        local_bdry_nodes = remote_bdry_nodes = None
+
     # We need a nested loop over remote and local groups here.
     # The code assumes that there is the same number of volume and surface groups.
     #
@@ -616,7 +904,9 @@ def make_partition_connection(actx, *, local_bdry_conn,
                             i_local_grp, rem_ipag.igroup,
                             matched_local_bdry_el_indices,
                             matched_remote_bdry_el_indices,
-                            src_aff_map=rem_ipag.aff_map)
+                            src_aff_map=rem_ipag.aff_map,
+                            tgt_bdry_nodes=local_bdry_nodes,
+                            src_bdry_nodes=remote_bdry_nodes)
 
                 part_batches[i_local_grp].extend(grp_batches)
 
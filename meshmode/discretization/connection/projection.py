@@ -20,13 +20,16 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+import operator
+from functools import reduce
+
 import numpy as np
 
 import loopy as lp
 from arraycontext import (
     NotAnArrayContainerError, deserialize_container, make_loopy_program,
     serialize_container)
-from pytools import keyed_memoize_in, keyed_memoize_method, memoize_in
+from pytools import keyed_memoize_in, memoize_in
 
 from meshmode.discretization.connection.chained import (
     ChainedDiscretizationConnection)
@@ -35,6 +38,11 @@ from meshmode.discretization.connection.direct import (
 from meshmode.transform_metadata import FirstAxisIsElementsTag
 
 
+# largest number of quadrature nodes for which the reduction in the
+# projection kernel is fully unrolled
+_MAX_UNROLLED_QUADRATURE_NODES = 8
+
+
 class L2ProjectionInverseDiscretizationConnection(DiscretizationConnection):
     """Creates an inverse :class:`DiscretizationConnection` from an existing
     connection to allow transporting from the original connection's
@@ -45,26 +53,36 @@ class L2ProjectionInverseDiscretizationConnection(DiscretizationConnection):
     .. attribute:: is_surjective
 
     .. attribute:: conn
+    .. attribute:: projection_dtype
+
+        If not *None*, the :mod:`numpy` dtype in which the (read-only)
+        projection matrices are stored on the device. Passing
+        :class:`numpy.float32` halves their memory traffic, at the cost of
+        single precision accuracy of the projection. The data being
+        projected keeps its own dtype.
+
     .. automethod:: __call__
 
     """
 
-    def __new__(cls, connections, is_surjective=False):
+    def __new__(cls, connections, is_surjective=False, projection_dtype=None):
         if isinstance(connections, DirectDiscretizationConnection):
             return DiscretizationConnection.__new__(cls)
         elif isinstance(connections, ChainedDiscretizationConnection):
             if len(connections.connections) == 0:
                 return connections
 
-            return cls(connections.connections, is_surjective=is_surjective)
+            return cls(connections.connections, is_surjective=is_surjective,
+                    projection_dtype=projection_dtype)
         else:
             conns = []
             for cnx in reversed(connections):
-                conns.append(cls(cnx, is_surjective=is_surjective))
+                conns.append(cls(cnx, is_surjective=is_surjective,
+                    projection_dtype=projection_dtype))
 
             return ChainedDiscretizationConnection(conns)
 
-    def __init__(self, conn, is_surjective=False):
+    def __init__(self, conn, is_surjective=False, projection_dtype=None):
         if conn.from_discr.dim != conn.to_discr.dim:
             raise RuntimeError("cannot transport from face to element")
 
@@ -72,13 +90,13 @@ class L2ProjectionInverseDiscretizationConnection(DiscretizationConnection):
             raise RuntimeError("`to_discr` must have an orthonormal basis")
 
         self.conn = conn
+        self.projection_dtype = projection_dtype
         super().__init__(
                 from_discr=self.conn.to_discr,
                 to_discr=self.conn.from_discr,
                 is_surjective=is_surjective)
 
-    @keyed_memoize_method(key=lambda actx: ())
-    def _batch_weights(self, actx):
+    def _batch_weights(self):
         """Computes scaled quadrature weights for each interpolation batch in
         :attr:`conn`. The quadrature weights can be used to integrate over
         child elements in the domain of the parent element, by a change of
@@ -86,37 +104,171 @@ class L2ProjectionInverseDiscretizationConnection(DiscretizationConnection):
 
         :return: a dictionary with keys ``(group_id, batch_id)``.
         """
+        @memoize_in(self.conn, (L2ProjectionInverseDiscretizationConnection,
+            "batch_weights"))
+        def batch_weights():
+            weights = {}
+
+            from meshmode.discretization.poly_element import diff_matrices
+            for igrp, grp in enumerate(self.to_discr.groups):
+                batches = self.conn.groups[igrp].batches
+                if not batches:
+                    continue
+
+                matrices = np.stack(diff_matrices(grp))
+                result_unit_nodes = np.stack(
+                        [batch.result_unit_nodes for batch in batches])
+
+                # jac[ibatch, inode, :, iaxis]: derivatives along unit axis iaxis
+                jac = np.einsum("aij,bkj->bika", matrices, result_unit_nodes)
+                group_weights = (
+                        np.abs(np.linalg.det(jac)) * grp.quadrature_rule().weights)
+
+                for ibatch in range(len(batches)):
+                    weights[igrp, ibatch] = group_weights[ibatch]
+
+            return weights
+
+        return batch_weights()
+
+    def _fused_batch_element_indices(self, actx):
+        """Collects the batches of each group in :attr:`conn` by their source
+        group, so that each such collection can be handled by a single kernel
+        invocation. Since the batches are applied in reverse, the element
+        indices are stored as tables indexed by the batch and the element
+        of the group in :attr:`to_discr`, so that the contributions of all
+        the batches can be gathered without write conflicts. Elements that
+        are not covered by a batch are marked by a negative index, so that
+        a single table per source group needs to be transferred.
+
+        :return: a list (one entry per group) of lists of tuples
+            ``(from_group_index, batch_ids, from_element_indices)``, where
+            the last entry is an array of shape ``(len(batch_ids), nelements)``.
+            If a single batch maps every element to the element with the
+            same number, it is *None* instead.
+        """
+        # NOTE: the device arrays belong to *actx*, so they are memoized for
+        # each array context, but on the connection, so that they go away
+        # together with it
+        @keyed_memoize_in(self.conn, (L2ProjectionInverseDiscretizationConnection,
+            "fused_batch_element_indices"),
+            lambda actx: actx)
+        def fused_batch_element_indices(actx):
+            result = []
+            for igrp, cgrp in enumerate(self.conn.groups):
+                nelements = self.to_discr.groups[igrp].nelements
+
+                from_group_to_batch_ids = {}
+                for ibatch, batch in enumerate(cgrp.batches):
+                    from_group_to_batch_ids.setdefault(
+                            batch.from_group_index, []).append(ibatch)
+
+                group_result = []
+                for from_group_index, batch_ids in from_group_to_batch_ids.items():
+                    from_element_indices = None
+
+                    for i, ibatch in enumerate(batch_ids):
+                        batch = cgrp.batches[ibatch]
+
+                        # NOTE: batch.*_element_indices are reversed here because
+                        # they are from the original forward connection, but
+                        # we are going in reverse here. a bit confusing, but
+                        # saves on recreating the connection groups and batches.
+                        to_element_indices = actx.to_numpy(
+                                actx.thaw(batch.from_element_indices))
+                        batch_from_element_indices = actx.to_numpy(
+                                actx.thaw(batch.to_element_indices))
+
+                        if from_element_indices is None:
+                            from_element_indices = np.full(
+                                    (len(batch_ids), nelements), -1,
+                                    dtype=batch_from_element_indices.dtype)
+
+                        from_element_indices[i, to_element_indices] = \
+                                batch_from_element_indices
+
+                    if (len(batch_ids) == 1
+                            and (from_element_indices >= 0).all()
+                            and self.from_discr.groups[from_group_index].nelements
+                            == nelements
+                            and np.array_equal(
+                                from_element_indices[0], np.arange(nelements))):
+                        group_result.append((from_group_index, batch_ids, None))
+                    else:
+                        group_result.append((
+                            from_group_index, batch_ids,
+                            actx.freeze(actx.from_numpy(from_element_indices))))
+
+                result.append(group_result)
+
+            return result
+
+        return fused_batch_element_indices(actx)
+
+    def _batch_projection_matrices(self, actx):
+        """Computes, for each interpolation batch in :attr:`conn`, the matrix
+        mapping values at the result unit nodes of the batch to nodal values
+        on the parent element. This is the tabulation of the basis functions
+        at the result unit nodes, scaled by the quadrature weights from
+        :meth:`_batch_weights`, which gives the basis coefficients, followed
+        by the Vandermonde matrix of the parent element.
+
+        :return: a list (one entry per group) of lists of tuples
+            ``(from_group_index, projection_mat, from_element_indices)``,
+            matching the entries of :meth:`_fused_batch_element_indices`,
+            where *projection_mat* contains the matrices of the batches
+            stacked along the first axis. This holds everything
+            :meth:`__call__` needs, so that it only does a single lookup
+            per call.
+        """
+        @keyed_memoize_in(self.conn, (L2ProjectionInverseDiscretizationConnection,
+            "batch_projection_matrices"),
+            lambda actx, projection_dtype: (actx,
+                None if projection_dtype is None else np.dtype(projection_dtype)))
+        def batch_projection_matrices(actx, projection_dtype):
+            from modepy import vandermonde
 
-        from functools import reduce
-        from operator import xor
+            weights = self._batch_weights()
 
-        from pymbolic.geometric_algebra import MultiVector
+            result = []
+            for igrp, cgrp in enumerate(self.conn.groups):
+                grp = self.to_discr.groups[igrp]
+                vdm = vandermonde(grp.basis_obj().functions, grp.unit_nodes)
 
-        def det(v):
-            nnodes = v[0].shape[0]
-            det_v = np.empty(nnodes)
+                group_result = []
+                for from_group_index, batch_ids, from_element_indices in \
+                        self._fused_batch_element_indices(actx)[igrp]:
+                    basis_fns = self.from_discr.groups[from_group_index] \
+                            .basis_obj().functions
 
-            for i in range(nnodes):
-                outer_product = reduce(xor, [MultiVector(x[i, :].T) for x in v])
-                det_v[i] = abs((outer_product.I | outer_product).as_scalar())
+                    # tabulate the basis at the nodes of all the batches at once
+                    result_unit_nodes = np.empty(
+                            (grp.dim, len(batch_ids), grp.nunit_dofs))
+                    for i, ibatch in enumerate(batch_ids):
+                        result_unit_nodes[:, i] = \
+                                cgrp.batches[ibatch].result_unit_nodes
 
-            return det_v
+                    basis_tabulation = vandermonde(basis_fns,
+                            result_unit_nodes.reshape(grp.dim, -1)).reshape(
+                                    len(batch_ids), grp.nunit_dofs, -1)
+                    quad_weights = np.stack(
+                            [weights[igrp, ibatch] for ibatch in batch_ids])
 
-        weights = {}
-        jac = np.empty(self.to_discr.dim, dtype=object)
+                    projection_mats = np.einsum("ij,bqj,bq->biq",
+                            vdm, basis_tabulation, quad_weights)
 
-        from meshmode.discretization.poly_element import diff_matrices
-        for igrp, grp in enumerate(self.to_discr.groups):
-            matrices = diff_matrices(grp)
+                    group_result.append((
+                        from_group_index,
+                        actx.freeze(
+                            actx.from_numpy(np.asarray(projection_mats,
+                                dtype=projection_dtype))),
+                        from_element_indices))
 
-            for ibatch, batch in enumerate(self.conn.groups[igrp].batches):
-                for iaxis in range(grp.dim):
-                    jac[iaxis] = matrices[iaxis] @ batch.result_unit_nodes.T
+                result.append(group_result)
 
-                weights[igrp, ibatch] = actx.freeze(actx.from_numpy(
-                    det(jac) * grp.quadrature_rule().weights))
+            return result
 
-        return weights
+        return batch_projection_matrices(actx, self.projection_dtype)
 
     def __call__(self, ary):
         """
@@ -146,111 +298,105 @@ class L2ProjectionInverseDiscretizationConnection(DiscretizationConnection):
 
         actx = ary.array_context
 
-        @memoize_in(actx, (L2ProjectionInverseDiscretizationConnection,
-            "conn_projection_knl"))
-        def kproj():
+        @keyed_memoize_in(actx, (L2ProjectionInverseDiscretizationConnection,
+            "conn_projection_knl"),
+            lambda n_to_nodes, nbatches: (n_to_nodes, nbatches))
+        def kproj(n_to_nodes, nbatches):
             t_unit = make_loopy_program(
                 [
-                    "{[iel_init]: 0 <= iel_init < n_to_elements}",
-                    "{[idof_init]: 0 <= idof_init < n_to_nodes}",
-                    "{[iel]: 0 <= iel < nelements}",
-                    "{[i_quad]: 0 <= i_quad < n_to_nodes}",
-                    "{[ibasis]: 0 <= ibasis < n_to_nodes}"
+                    "{[iel]: 0 <= iel < n_to_elements}",
+                    "{[idof]: 0 <= idof < n_to_nodes}",
+                    "{[ibatch]: 0 <= ibatch < nbatches}",
+                    "{[i_quad]: 0 <= i_quad < n_to_nodes}"
                 ],
                 """
-                    result[iel_init, idof_init] = 0 {id=init}
-                    ... gbarrier {id=barrier, dep=init}
-                    result[to_element_indices[iel], ibasis] =               \
-                        result[to_element_indices[iel], ibasis] +           \
-                        sum(i_quad, ary[from_element_indices[iel], i_quad]  \
-                                    * basis_tabulation[ibasis, i_quad]      \
-                                    * weights[i_quad]) {dep=barrier}
+                    result[iel, idof] = sum((ibatch, i_quad),                   \
+                        (ary[from_element_indices[ibatch, iel], i_quad]       \
+                            * projection_mat[ibatch, idof, i_quad])           \
+                        if from_element_indices[ibatch, iel] >= 0 else 0)
                 """,
                 [
                     lp.GlobalArg("ary", None,
-                                 shape=("n_from_elements", "n_from_nodes")),
+                                 shape=("n_from_elements", "n_from_nodes"),
+                                 is_output=False),
                     lp.GlobalArg("result", None,
                                  shape=("n_to_elements", "n_to_nodes"),
                                  is_input=False),
-                    lp.GlobalArg("basis_tabulation", None,
-                                 shape=("n_to_nodes", "n_to_nodes")),
-                    lp.GlobalArg("weights", None,
-                                 shape="n_from_nodes"),
+                    lp.GlobalArg("projection_mat", None,
+                                 shape=("nbatches", "n_to_nodes", "n_to_nodes"),
+                                 is_output=False),
+                    lp.GlobalArg("from_element_indices", None,
+                                 shape=("nbatches", "n_to_elements"),
+                                 is_output=False),
                     lp.ValueArg("n_from_elements", np.int32),
                     lp.ValueArg("n_from_nodes", np.int32),
                     lp.ValueArg("n_to_elements", np.int32),
                     lp.ValueArg("n_to_nodes", np.int32),
+                    lp.ValueArg("nbatches", np.int32),
                     "..."
                 ],
                 name="conn_projection_knl"
             )
+
+            # the node and batch counts only take a few values, so specialize
+            # on them to get fixed loop bounds for the reduction
+            t_unit = lp.fix_parameters(t_unit,
+                    n_to_nodes=n_to_nodes, nbatches=nbatches)
+
             from meshmode.transform_metadata import (
                 ConcurrentDOFInameTag, ConcurrentElementInameTag)
-            return lp.tag_inames(t_unit, {
-                    "iel_init": ConcurrentElementInameTag(),
-                    "idof_init": ConcurrentDOFInameTag(),
+            iname_to_tag = {
                     "iel": ConcurrentElementInameTag(),
-                    "ibasis": ConcurrentDOFInameTag(),
-                    })
-
-        # compute weights on each refinement of the reference element
-        weights = self._batch_weights(actx)
-
-        # perform dot product (on reference element) to get basis coefficients
-        c_group_data = []
-        for igrp, cgrp in enumerate(self.conn.groups):
-            c_batch_data = []
-            for ibatch, batch in enumerate(cgrp.batches):
-                sgrp = self.from_discr.groups[batch.from_group_index]
-
-                # Generate the basis tabulation matrix
-                tabulations = []
-                for basis_fn in sgrp.basis_obj().functions:
-                    tabulations.append(basis_fn(batch.result_unit_nodes).flatten())
-                tabulations = actx.from_numpy(np.asarray(tabulations))
-
-                # NOTE: batch.*_element_indices are reversed here because
-                # they are from the original forward connection, but
-                # we are going in reverse here. a bit confusing, but
-                # saves on recreating the connection groups and batches.
-                c_batch_data.append(
+                    "idof": ConcurrentDOFInameTag(),
+                    }
+            if n_to_nodes <= _MAX_UNROLLED_QUADRATURE_NODES:
+                iname_to_tag["i_quad"] = "unr"
+
+            return lp.tag_inames(t_unit, iname_to_tag)
+
+        # perform dot product (on reference element) to get basis coefficients,
+        # and evaluate the resulting expansion at the nodes
+        group_data = []
+        for igrp, group_projection_data in enumerate(
+                self._batch_projection_matrices(actx)):
+            source_group_data = []
+            for from_group_index, projection_mat, from_element_indices \
+                    in group_projection_data:
+                if from_element_indices is None:
+                    # no indirection needed, so use a dense matrix product
+                    source_group_data.append(
+                        actx.einsum("ij,ej->ei",
+                                    actx.thaw(projection_mat)[0],
+                                    ary[from_group_index],
+                                    arg_names=("projection_mat", "ary"),
+                                    tagged=(FirstAxisIsElementsTag(),)))
+                    continue
+
+                source_group_data.append(
                     actx.call_loopy(
-                        kproj(),
-                        ary=ary[batch.from_group_index],
-                        basis_tabulation=tabulations,
-                        weights=weights[igrp, ibatch],
-                        from_element_indices=batch.to_element_indices,
-                        to_element_indices=batch.from_element_indices,
+                        kproj(self.to_discr.groups[igrp].nunit_dofs,
+                              projection_mat.shape[0]),
+                        ary=ary[from_group_index],
+                        projection_mat=projection_mat,
+                        from_element_indices=from_element_indices,
                         n_to_elements=self.to_discr.groups[igrp].nelements,
-                        n_to_nodes=self.to_discr.groups[igrp].nunit_dofs,
                     )["result"]
                 )
 
-            c_group_data.append(sum(c_batch_data))
-        coefficients = DOFArray(actx, data=tuple(c_group_data))
-
-        @keyed_memoize_in(
-            actx, (L2ProjectionInverseDiscretizationConnection,
-                   "vandermonde_matrix"),
-            lambda grp: grp.discretization_key()
-        )
-        def vandermonde_matrix(grp):
-            from modepy import vandermonde
-            vdm = vandermonde(grp.basis_obj().functions,
-                              grp.unit_nodes)
-            return actx.from_numpy(vdm)
-
-        return DOFArray(
-            actx,
-            data=tuple(
-                actx.einsum("ij,ej->ei",
-                            vandermonde_matrix(grp),
-                            c_i,
-                            arg_names=("vdm", "coeffs"),
-                            tagged=(FirstAxisIsElementsTag(),))
-                for grp, c_i in zip(self.to_discr.groups, coefficients)
-            )
-        )
+            if source_group_data:
+                # NOTE: there is usually a single source group, and the builtin
+                # sum would still add its contribution to zero in a separate
+                # kernel
+                group_data.append(reduce(operator.add, source_group_data))
+            else:
+                # If no batched data at all, return zeros for this
+                # particular group array
+                group_data.append(actx.zeros(
+                        shape=(self.to_discr.groups[igrp].nelements,
+                               self.to_discr.groups[igrp].nunit_dofs),
+                        dtype=ary.entry_dtype))
+
+        return DOFArray(actx, data=tuple(group_data))
 
 
 # vim: foldmethod=marker
@@ -24,6 +24,7 @@ THE SOFTWARE.
 """
 
 from abc import abstractmethod
+from functools import lru_cache
 from typing import ClassVar, Tuple
 from warnings import warn
 
@@ -112,6 +113,18 @@ Type-based group factories
 
 # {{{ matrices
 
+@lru_cache
+def _equidistant_nodes(dim: int, order: int) -> np.ndarray:
+    """Equidistant nodes on the reference simplex, shared (read-only) by all
+    the element groups with the same *dim* and *order*, e.g. for the many
+    discretizations created by visualizers with ``force_equidistant=True``.
+    """
+    result = mp.equidistant_nodes(dim, order)
+    result.setflags(write=False)
+
+    return result
+
+
 @memoize_on_first_arg
 def mass_matrix(grp: InterpolatoryElementGroupBase) -> np.ndarray:
     if not isinstance(grp, InterpolatoryElementGroupBase):
@@ -441,7 +454,7 @@ class PolynomialEquidistantSimplexElementGroup(_MassMatrixQuadratureElementGroup
     @memoize_method
     def _interp_nodes(self):
         dim = self.mesh_el_group.dim
-        result = mp.equidistant_nodes(dim, self.order)
+        result = _equidistant_nodes(dim, self.order)
 
         dim2, _ = result.shape
         assert dim2 == dim
@@ -651,8 +664,7 @@ class EquidistantTensorProductElementGroup(LegendreTensorProductElementGroup):
     """
 
     def __init__(self, mesh_el_group, order, index=None):
-        from modepy.nodes import equidistant_nodes
-        unit_nodes_1d = equidistant_nodes(1, order)[0]
+        unit_nodes_1d = _equidistant_nodes(1, order)[0]
         unit_nodes = mp.tensor_product_nodes([unit_nodes_1d]*mesh_el_group.dim)
 
         super().__init__(mesh_el_group, order, index=index,
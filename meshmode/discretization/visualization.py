@@ -25,7 +25,7 @@ THE SOFTWARE.
 
 import logging
 from dataclasses import dataclass
-from functools import singledispatch
+from functools import lru_cache, singledispatch
 from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
@@ -41,6 +41,10 @@ from meshmode.transform_metadata import DiscretizationFlattenedDOFAxisTag
 
 logger = logging.getLogger(__name__)
 
+# NOTE: the VTK XML generators emit many small writes (one per tag, attribute
+# and data chunk), so a large file buffer collects them into few system calls
+_VTK_FILE_BUFFER_SIZE = 2**20
+
 __doc__ = """
 
 .. autofunction:: make_visualizer
@@ -109,6 +113,27 @@ def _resample_to_numpy(conn, vis_discr, vec, *, stack=False, by_group=False):
     # https://github.com/inducer/pyvisfile/pull/12#discussion_r550959081
     # for (minimal) discussion.
     if isinstance(vec, np.ndarray) and vec.dtype.char == "O":
+        if (not by_group
+                and vec.size > 0
+                and all(isinstance(x, DOFArray) for x in vec)
+                and len({x.entry_dtype for x in vec}) == 1):
+            # NOTE: all the components are transferred as one stacked array,
+            # instead of one transfer for each of them
+            actx = vec[0].array_context
+            resampled = [conn(x) for x in vec]
+            if __debug__:
+                from meshmode.dof_array import check_dofarray_against_discr
+                for x in resampled:
+                    check_dofarray_against_discr(vis_discr, x)
+
+            r = actx.to_numpy(actx.np.stack([
+                actx.tag_axis(0,
+                              DiscretizationFlattenedDOFAxisTag(),
+                              flatten(x, actx))
+                for x in resampled]))
+
+            return r if stack else make_obj_array(list(r))
+
         from pytools.obj_array import obj_array_vectorize
         r = obj_array_vectorize(
                 lambda x: _resample_to_numpy(conn, vis_discr, x, by_group=by_group),
@@ -270,6 +295,56 @@ def _(shape: Hypercube, node_tuples):
 
     return elements
 
+
+@lru_cache
+def _vtk_linear_reference_connectivity(shape: Shape, order: int):
+    """
+    :returns: a read-only array of shape ``(nsubelements, nvertices)``
+        containing the VTK subelements of the reference element, which
+        only depends on *shape* and *order*, and is therefore shared between
+        all the groups (and discretizations) that use them.
+    """
+    import modepy as mp
+    space = mp.space_for_shape(shape, order)
+    node_tuples = mp.node_tuples_for_space(space)
+
+    el_connectivity = np.array(
+            vtk_submesh_for_shape(shape, node_tuples),
+            dtype=np.intp)
+    el_connectivity.setflags(write=False)
+
+    return el_connectivity, len(node_tuples)
+
+
+@lru_cache
+def _vtk_lagrange_reference_connectivity(
+        is_simplex: bool, dim: int, order: int, vtk_version: Tuple[int, ...]):
+    """
+    :returns: a read-only array of shape ``(1, 1, nnodes)`` containing the
+        permutation from the VTK Lagrange node ordering to the modepy node
+        ordering of the reference element.
+    """
+    from pyvisfile.vtk import vtk_ordering
+
+    if is_simplex:
+        node_tuples = vtk_ordering.vtk_lagrange_simplex_node_tuples(
+                dim, order, vtk_version=vtk_version)
+        permutation = (
+                vtk_ordering.vtk_lagrange_simplex_node_tuples_to_permutation(
+                    node_tuples))
+    else:
+        node_tuples = vtk_ordering.vtk_lagrange_quad_node_tuples(
+                dim, order, vtk_version=vtk_version)
+        permutation = vtk_ordering.vtk_lagrange_quad_node_tuples_to_permutation(
+                node_tuples)
+
+    el_connectivity = np.array(
+            permutation,
+            dtype=np.intp).reshape((1, 1, -1))
+    el_connectivity.setflags(write=False)
+
+    return el_connectivity, len(node_tuples)
+
 # }}}
 
 
@@ -320,11 +395,8 @@ class VTKConnectivity:
             space = mp.space_for_shape(shape, grp.order)
             assert type(space) == type(grp.mesh_el_group._modepy_space)  # noqa: E721
 
-            node_tuples = mp.node_tuples_for_space(space)
-
-            el_connectivity = np.array(
-                    vtk_submesh_for_shape(shape, node_tuples),
-                    dtype=np.intp)
+            el_connectivity, nnodes = \
+                    _vtk_linear_reference_connectivity(shape, grp.order)
 
             if isinstance(shape, Simplex):
                 vtk_cell_type = self.simplex_cell_types[shape.dim]
@@ -337,7 +409,7 @@ class VTKConnectivity:
             raise NotImplementedError("visualization for element groups "
                     "of type '%s'" % type(grp.mesh_el_group).__name__)
 
-        assert len(node_tuples) == grp.nunit_dofs
+        assert nnodes == grp.nunit_dofs
         return el_connectivity, vtk_cell_type
 
     @property
@@ -428,36 +500,20 @@ class VTKLagrangeConnectivity(VTKConnectivity):
 
         vtk_version = tuple(int(v) for v in self.version.split("."))
         if isinstance(grp.mesh_el_group, SimplexElementGroup):
-            from pyvisfile.vtk.vtk_ordering import (
-                vtk_lagrange_simplex_node_tuples,
-                vtk_lagrange_simplex_node_tuples_to_permutation)
-
-            node_tuples = vtk_lagrange_simplex_node_tuples(
-                    grp.dim, grp.order, vtk_version=vtk_version)
-            el_connectivity = np.array(
-                    vtk_lagrange_simplex_node_tuples_to_permutation(node_tuples),
-                    dtype=np.intp).reshape((1, 1, -1))
-
+            el_connectivity, nnodes = _vtk_lagrange_reference_connectivity(
+                    True, grp.dim, grp.order, vtk_version)
             vtk_cell_type = self.simplex_cell_types[grp.dim]
 
         elif isinstance(grp.mesh_el_group, TensorProductElementGroup):
-            from pyvisfile.vtk.vtk_ordering import (
-                vtk_lagrange_quad_node_tuples,
-                vtk_lagrange_quad_node_tuples_to_permutation)
-
-            node_tuples = vtk_lagrange_quad_node_tuples(
-                    grp.dim, grp.order, vtk_version=vtk_version)
-            el_connectivity = np.array(
-                    vtk_lagrange_quad_node_tuples_to_permutation(node_tuples),
-                    dtype=np.intp).reshape((1, 1, -1))
-
+            el_connectivity, nnodes = _vtk_lagrange_reference_connectivity(
+                    False, grp.dim, grp.order, vtk_version)
             vtk_cell_type = self.tensor_cell_types[grp.dim]
 
         else:
             raise NotImplementedError("visualization for element groups "
                     "of type '%s'" % type(grp.mesh_el_group).__name__)
 
-        assert len(node_tuples) == grp.nunit_dofs
+        assert nnodes == grp.nunit_dofs
         return el_connectivity, vtk_cell_type
 
     @property
@@ -828,7 +884,7 @@ class Visualizer:
 
         # }}}
 
-        with open(file_name, "w") as outf:
+        with open(file_name, "w", buffering=_VTK_FILE_BUFFER_SIZE) as outf:
             generator = AppendedDataXMLGenerator(
                     compressor=compressor,
                     vtk_file_version=connectivity.version)
@@ -934,7 +990,13 @@ class Visualizer:
                 shape = (shape[0], 3)
 
             dset = grp.create_dataset(name, shape, dtype=data.dtype, **dset_options)
-            dset[offset:offset + data.shape[0]] = data
+            if use_collective_io:
+                # NOTE: every rank writes its part of every dataset, so the
+                # writes can be collective, which lets MPI-IO aggregate them
+                with dset.collective:
+                    dset[offset:offset + data.shape[0]] = data
+            else:
+                dset[offset:offset + data.shape[0]] = data
 
             return dset
 
@@ -974,16 +1036,26 @@ class Visualizer:
                 global_cell_count = cell_count
                 global_node_count = node_count
                 global_conn_count = conn_count
+
+                use_collective_io = False
             else:
                 from mpi4py import MPI
 
-                # FIXME: should be able to do all these in one go
-                global_cell_offset = comm.scan(cell_count) - cell_count
-                global_node_offset = comm.scan(node_count) - node_count
-                global_conn_offset = comm.scan(conn_count) - conn_count
-                global_cell_count = comm.allreduce(cell_count, op=MPI.SUM)
-                global_node_count = comm.allreduce(node_count, op=MPI.SUM)
-                global_conn_count = comm.allreduce(conn_count, op=MPI.SUM)
+                # NOTE: h5py skips writes with empty selections, so a rank
+                # without any cells would not take part in collective writes
+                # and needs to be counted as well
+                counts = np.array([
+                    cell_count, node_count, conn_count,
+                    int(min(cell_count, node_count) == 0)])
+
+                offsets = comm.scan(counts, op=MPI.SUM) - counts
+                totals = comm.allreduce(counts, op=MPI.SUM)
+
+                global_cell_offset, global_node_offset, global_conn_offset = \
+                        offsets[:3].tolist()
+                global_cell_count, global_node_count, global_conn_count = \
+                        totals[:3].tolist()
+                use_collective_io = totals[3] == 0
 
             # }}}
 
@@ -1395,7 +1467,7 @@ def write_nodal_adjacency_vtk_file(file_name, mesh,
         else:
             raise FileExistsError("output file '%s' already exists" % file_name)
 
-    with open(file_name, "w") as outf:
+    with open(file_name, "w", buffering=_VTK_FILE_BUFFER_SIZE) as outf:
         AppendedDataXMLGenerator(compressor)(grid).write(outf)
 
 # }}}
@@ -407,6 +407,7 @@ class TensorProductElementGroup(_ModepyElementGroup):
 
     _modepy_shape_cls: ClassVar[Type[mp.Shape]] = mp.Hypercube
 
+    @property
     def is_affine(self):
         # Tensor product mappings are generically bilinear.
         # FIXME: Are affinely mapped ones a 'juicy' enough special case?
@@ -2,6 +2,7 @@
 .. autoclass:: FirstAxisIsElementsTag
 .. autoclass:: ConcurrentElementInameTag
 .. autoclass:: ConcurrentDOFInameTag
+.. autoclass:: ConcurrentBatchInameTag
 .. autoclass:: DiscretizationEntityAxisTag
 .. autoclass:: DiscretizationElementAxisTag
 .. autoclass:: DiscretizationFaceAxisTag
@@ -65,6 +66,19 @@ class ConcurrentDOFInameTag(Tag):
     """
 
 
+class ConcurrentBatchInameTag(Tag):
+    """A tag applicable to an iname indicating that this iname is used to
+    iterate over independent instances of a batched computation (e.g. several
+    fields) that share the same element and DOF structure. States that no
+    dependencies exist between the instances, i.e. that computations for all
+    of them may be performed concurrently.
+
+    When such an iname is also used as the third index of an output
+    array whose first two axes iterate over elements and DOFs, it is
+    mapped onto a separate hardware axis.
+    """
+
+
 class DiscretizationEntityAxisTag(UniqueTag):
     """
     A tag applicable to an array's axis to describe which discretization entity
@@ -26,18 +26,24 @@ from dataclasses import dataclass
 import numpy as np
 import pytest
 
+import loopy as lp
 from arraycontext import (
-    dataclass_array_container, pytest_generate_tests_for_array_contexts,
-    with_container_arithmetic)
+    dataclass_array_container, make_loopy_program,
+    pytest_generate_tests_for_array_contexts, with_container_arithmetic)
+from loopy.kernel.data import GroupInameTag, LocalInameTag, UnrollTag
 from pytools.obj_array import make_obj_array
 from pytools.tag import Tag
 
 from meshmode import _acf  # noqa: F401
 from meshmode.array_context import (
+    PyOpenCLArrayContext, PytatoPyOpenCLArrayContext,
     PytestPyOpenCLArrayContextFactory, PytestPytatoPyOpenCLArrayContextFactory)
 from meshmode.discretization import Discretization
 from meshmode.discretization.poly_element import default_simplex_group_factory
 from meshmode.dof_array import DOFArray, array_context_for_pickling, flat_norm
+from meshmode.transform_metadata import (
+    ConcurrentBatchInameTag, ConcurrentDOFInameTag, ConcurrentElementInameTag,
+    FirstAxisIsElementsTag)
 
 
 logger = logging.getLogger(__name__)
@@ -226,6 +232,230 @@ def test_dof_array_pickling_tags(actx_factory):
 # }}}
 
 
+# {{{ test_element_and_dof_iname_transform
+
+def _make_scale_program(nelements, ndofs, iname_tags=None):
+    t_unit = make_loopy_program(
+            "{[iel, idof]: 0 <= iel < nelements and 0 <= idof < ndofs}",
+            "result[iel, idof] = 2*ary[iel, idof]",
+            name="scale")
+    t_unit = lp.fix_parameters(t_unit, nelements=nelements, ndofs=ndofs)
+
+    if iname_tags is not None:
+        t_unit = lp.tag_inames(t_unit, iname_tags)
+
+    return t_unit
+
+
+def _get_iname_tag_types(knl, iname):
+    return {type(tag) for tag in knl.inames[iname].tags}
+
+
+def _check_transformed_result(actx, t_unit, ary):
+    """Compare the result of the transformed *t_unit* to the one obtained by
+    running it as given.
+    """
+    ary_dev = actx.from_numpy(ary)
+
+    result = actx.call_loopy(t_unit, ary=ary_dev)["result"]
+    _, ref_result = t_unit(actx.queue, ary=ary_dev)
+
+    assert np.array_equal(
+            actx.to_numpy(result), actx.to_numpy(ref_result["result"]))
+
+
+@pytest.mark.parametrize(("ndofs", "tile"), [
+    # fits into a single work group
+    (20, None),
+    # no tile divides the number of work-group-sized chunks
+    (70, None),
+    (160, None),
+    # tiled
+    (256, 8),
+    (384, 4),
+    ])
+def test_element_and_dof_iname_transform(actx_factory, ndofs, tile):
+    actx = actx_factory()
+
+    if not isinstance(actx, PyOpenCLArrayContext):
+        pytest.skip(f"{actx}: does not transform loopy programs")
+
+    nelements = 5
+    t_unit = _make_scale_program(nelements, ndofs, {
+        "iel": ConcurrentElementInameTag(),
+        "idof": ConcurrentDOFInameTag(),
+        })
+    knl = actx.transform_loopy_program(t_unit).default_entrypoint
+
+    assert GroupInameTag in _get_iname_tag_types(knl, "iel")
+    if ndofs <= 32:
+        assert LocalInameTag in _get_iname_tag_types(knl, "idof")
+        assert "idof_inner" not in knl.inames
+    else:
+        assert "idof" not in knl.inames
+        assert LocalInameTag in _get_iname_tag_types(knl, "idof_inner")
+
+        if tile is None:
+            assert "idof_outer_inner" not in knl.inames
+        else:
+            assert UnrollTag in _get_iname_tag_types(knl, "idof_outer_inner")
+            assert knl.get_constant_iname_length("idof_outer_inner") == tile
+
+    rng = np.random.default_rng(seed=42)
+    _check_transformed_result(actx, t_unit, rng.random((nelements, ndofs)))
+
+
+def test_element_and_dof_iname_transform_pretagged(actx_factory):
+    actx = actx_factory()
+
+    if not isinstance(actx, PyOpenCLArrayContext):
+        pytest.skip(f"{actx}: does not transform loopy programs")
+
+    nelements, ndofs = 5, 70
+    rng = np.random.default_rng(seed=42)
+
+    # DOF iname already mapped onto a hardware axis
+    t_unit = _make_scale_program(nelements, ndofs, {
+        "iel": ConcurrentElementInameTag(),
+        "idof": ConcurrentDOFInameTag(),
+        })
+    t_unit = lp.tag_inames(t_unit, {"idof": "l.0"})
+    knl = actx.transform_loopy_program(t_unit).default_entrypoint
+
+    assert GroupInameTag in _get_iname_tag_types(knl, "iel")
+    assert LocalInameTag in _get_iname_tag_types(knl, "idof")
+    assert "idof_inner" not in knl.inames
+
+    _check_transformed_result(actx, t_unit, rng.random((nelements, ndofs)))
+
+    # all inames already mapped onto hardware axes
+    t_unit = _make_scale_program(nelements, ndofs, {"iel": "g.0", "idof": "l.0"})
+    assert actx.transform_loopy_program(t_unit) is t_unit
+
+
+@pytest.mark.parametrize("tagged", ["inames", "output"])
+def test_batch_iname_transform(actx_factory, tagged):
+    actx = actx_factory()
+
+    if not isinstance(actx, PyOpenCLArrayContext):
+        pytest.skip(f"{actx}: does not transform loopy programs")
+
+    nelements, ndofs, nbatches = 5, 10, 3
+    t_unit = make_loopy_program(
+            "{[iel, idof, ibatch]: 0 <= iel < nelements and 0 <= idof < ndofs "
+            "and 0 <= ibatch < nbatches}",
+            "result[iel, idof, ibatch] = 2*ary[iel, idof, ibatch]",
+            name="scale_batched")
+    t_unit = lp.fix_parameters(t_unit,
+            nelements=nelements, ndofs=ndofs, nbatches=nbatches)
+    t_unit = lp.tag_inames(t_unit, {"ibatch": ConcurrentBatchInameTag()})
+
+    if tagged == "inames":
+        t_unit = lp.tag_inames(t_unit, {
+            "iel": ConcurrentElementInameTag(),
+            "idof": ConcurrentDOFInameTag(),
+            })
+    elif tagged == "output":
+        knl = t_unit.default_entrypoint
+        t_unit = t_unit.with_kernel(knl.copy(args=[
+            arg.tagged(FirstAxisIsElementsTag()) if arg.name == "result" else arg
+            for arg in knl.args]))
+    else:
+        raise ValueError(f"unknown tagging: '{tagged}'")
+
+    knl = actx.transform_loopy_program(t_unit).default_entrypoint
+
+    iname_to_axis = {
+        iname: tag.axis
+        for iname in ["iel", "idof", "ibatch"]
+        for tag in knl.inames[iname].tags
+        if isinstance(tag, (GroupInameTag, LocalInameTag))}
+    assert GroupInameTag in _get_iname_tag_types(knl, "iel")
+    assert GroupInameTag in _get_iname_tag_types(knl, "ibatch")
+    assert LocalInameTag in _get_iname_tag_types(knl, "idof")
+    assert iname_to_axis == {"iel": 0, "ibatch": 1, "idof": 0}
+
+    rng = np.random.default_rng(seed=42)
+    _check_transformed_result(
+            actx, t_unit, rng.random((nelements, ndofs, nbatches)))
+
+
+def test_element_and_dof_iname_transform_shared():
+    from meshmode.array_context import _get_kernel_transform
+
+    def make_kernel():
+        return _make_scale_program(5, 70, {
+            "iel": ConcurrentElementInameTag(),
+            "idof": ConcurrentDOFInameTag(),
+            }).default_entrypoint
+
+    knl = make_kernel()
+    other_knl = make_kernel()
+    assert knl is not other_knl
+
+    transform = _get_kernel_transform(knl)
+    assert transform is not None
+    assert _get_kernel_transform(other_knl) is transform
+
+
+@pytest.mark.parametrize("seq_type", [list, tuple, frozenset])
+def test_element_and_dof_iname_transform_sequences(actx_factory, seq_type):
+    actx = actx_factory()
+
+    if not isinstance(actx, PyOpenCLArrayContext):
+        pytest.skip(f"{actx}: does not transform loopy programs")
+
+    from meshmode.array_context import _transform_with_element_and_dof_inames
+
+    nelements, ndofs = 5, 70
+    t_unit = _make_scale_program(nelements, ndofs)
+    knl = _transform_with_element_and_dof_inames(t_unit,
+            el_inames=seq_type(["iel"]),
+            dof_inames=seq_type(["idof"])).default_entrypoint
+
+    assert GroupInameTag in _get_iname_tag_types(knl, "iel")
+    assert LocalInameTag in _get_iname_tag_types(knl, "idof_inner")
+
+    with pytest.raises(ValueError):
+        _transform_with_element_and_dof_inames(t_unit,
+                el_inames=seq_type(["iel"]),
+                dof_inames=seq_type(["iel", "idof"]))
+
+# }}}
+
+
+# {{{ test_transform_dag_named_arrays
+
+def test_transform_dag_named_arrays(actx_factory):
+    actx = actx_factory()
+
+    if not isinstance(actx, PytatoPyOpenCLArrayContext):
+        pytest.skip(f"{actx}: does not transform pytato DAGs")
+
+    import pytato as pt
+
+    from meshmode.array_context import _contains_named_arrays
+
+    nelements, ndofs = 5, 10
+    ary = np.random.default_rng(seed=42).random((nelements, ndofs))
+    ary_dev = actx.from_numpy(ary)
+
+    # pure pytato arithmetic: nothing to untag
+    result = actx.tag(FooTag(), 2*ary_dev)
+    assert not _contains_named_arrays(
+            pt.make_dict_of_named_arrays({"result": result}))
+    assert np.array_equal(actx.to_numpy(actx.freeze(result)), 2*ary)
+
+    # loopy call results need to be untagged
+    t_unit = _make_scale_program(nelements, ndofs)
+    result = actx.tag(FooTag(), actx.call_loopy(t_unit, ary=ary_dev)["result"])
+    assert _contains_named_arrays(
+            pt.make_dict_of_named_arrays({"result": result}))
+    assert np.array_equal(actx.to_numpy(actx.freeze(result)), 2*ary)
+
+# }}}
+
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv) > 1:
@@ -398,6 +398,121 @@ def test_reversed_chained_connection(actx_factory, ndim, mesh_name):
     assert eoc.order_estimate() > (order + 1 - 0.5)
 
 
+def test_reversed_connection_single_precision_tables(actx_factory):
+    actx = actx_factory()
+
+    discr = create_discretization(actx, 2, nelements=32, mesh_name="starfish")
+    conn = create_refined_connection(actx, discr, threshold=1.0)
+
+    from meshmode.discretization.connection import (
+        L2ProjectionInverseDiscretizationConnection)
+    reverse = L2ProjectionInverseDiscretizationConnection(conn)
+    reverse_single = L2ProjectionInverseDiscretizationConnection(conn,
+            projection_dtype=np.float32)
+
+    to_nodes = actx.thaw(conn.to_discr.nodes())
+    to_x = actx.np.cos(to_nodes[0]) + actx.np.sin(to_nodes[1])
+
+    from_interp = reverse(to_x)
+    from_interp_single = reverse_single(to_x)
+    assert from_interp_single[0].dtype == to_x[0].dtype
+
+    error = actx.to_numpy(
+            flat_norm(from_interp_single - from_interp, np.inf)
+            / flat_norm(from_interp, np.inf))
+    assert error < 1.0e-5
+
+
+def test_reversed_connection_array_contexts(actx_factory):
+    actx = actx_factory()
+    other_actx = actx_factory()
+
+    discr = create_discretization(actx, 2, nelements=16)
+    conn = create_refined_connection(actx, discr, threshold=1.0)
+
+    from meshmode.discretization.connection import (
+        L2ProjectionInverseDiscretizationConnection)
+    reverse = L2ProjectionInverseDiscretizationConnection(conn)
+
+    # device data is cached separately for each array context
+    projection_mats = reverse._batch_projection_matrices(actx)
+    assert reverse._batch_projection_matrices(actx) is projection_mats
+    assert reverse._batch_projection_matrices(other_actx) is not projection_mats
+    assert (reverse._fused_batch_element_indices(other_actx)
+            is not reverse._fused_batch_element_indices(actx))
+
+
+def test_reversed_connection_not_kept_alive(actx_factory):
+    actx = actx_factory()
+
+    discr = create_discretization(actx, 2, nelements=16)
+    conn = create_refined_connection(actx, discr, threshold=1.0)
+
+    from meshmode.discretization.connection import (
+        L2ProjectionInverseDiscretizationConnection)
+    reverse = L2ProjectionInverseDiscretizationConnection(conn)
+
+    to_nodes = actx.thaw(conn.to_discr.nodes())
+    reverse(to_nodes[0])
+
+    # the cached device data must not keep the connection alive
+    import gc
+    import weakref
+    conn_ref = weakref.ref(conn)
+    del conn, reverse, to_nodes
+    gc.collect()
+
+    assert conn_ref() is None
+
+
+def test_reversed_connection_uncovered_group(actx_factory):
+    actx = actx_factory()
+
+    from meshmode.mesh.generation import generate_regular_rect_mesh
+    from meshmode.mesh.processing import affine_map, merge_disjoint_meshes
+
+    order = 4
+    mesh = generate_regular_rect_mesh(
+            a=(0.0, 0.0), b=(1.0, 1.0), nelements_per_axis=(4, 4), order=order)
+    mesh = merge_disjoint_meshes([
+        mesh, affine_map(mesh, b=np.array([2.0, 0.0]))
+        ])
+    assert len(mesh.groups) == 2
+
+    from meshmode.discretization import Discretization
+    from meshmode.discretization.poly_element import (
+        InterpolatoryQuadratureSimplexGroupFactory)
+    group_factory = InterpolatoryQuadratureSimplexGroupFactory(order)
+    from_discr = Discretization(actx, mesh, group_factory)
+    to_discr = Discretization(actx, mesh, group_factory)
+
+    from meshmode.discretization.connection import (
+        DirectDiscretizationConnection, DiscretizationConnectionElementGroup,
+        L2ProjectionInverseDiscretizationConnection, make_same_mesh_connection)
+    conn = make_same_mesh_connection(actx, to_discr, from_discr)
+
+    # no batches contribute to the second group
+    partial_conn = DirectDiscretizationConnection(
+            from_discr, to_discr,
+            [conn.groups[0], DiscretizationConnectionElementGroup([])],
+            is_surjective=False)
+
+    to_nodes = actx.thaw(to_discr.nodes())
+    to_x = actx.np.cos(to_nodes[0]) + actx.np.sin(to_nodes[1])
+
+    from_interp = L2ProjectionInverseDiscretizationConnection(conn)(to_x)
+    partial_from_interp = (
+            L2ProjectionInverseDiscretizationConnection(partial_conn)(to_x))
+
+    assert np.array_equal(
+            actx.to_numpy(partial_from_interp[0]), actx.to_numpy(from_interp[0]))
+
+    partial_from_interp_1 = actx.to_numpy(partial_from_interp[1])
+    assert partial_from_interp_1.shape == (
+            from_discr.groups[1].nelements, from_discr.groups[1].nunit_dofs)
+    assert not partial_from_interp_1.any()
+
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv) > 1:
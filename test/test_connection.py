@@ -92,6 +92,86 @@ def test_bdry_restriction_is_permutation(actx_factory, group_factory, dim, order
     assert not bdry_connection_upsample.is_permutation()
 
 
+@pytest.mark.parametrize("nnodes", [10, 100])
+def test_opposite_face_node_matching(nnodes):
+    """Check that the dense and tree-based node matching used to build
+    opposite-face connections agree.
+    """
+    pytest.importorskip("scipy")
+
+    import numpy as np
+
+    from meshmode.discretization.connection.opposite_face import (
+        _find_src_node_indices_dense, _find_src_node_indices_kdtree)
+
+    rng = np.random.default_rng(seed=42)
+    nelements = 50
+    tol = 1.0e4 * np.finfo(np.float64).eps
+
+    # make nodes in neighboring elements coincide
+    src_nodes = rng.random((3, nelements, nnodes))
+    src_nodes[:, 1::2] = src_nodes[:, 0::2]
+    perms = np.array([rng.permutation(nnodes) for _ in range(nelements)])
+    tgt_nodes = src_nodes[:, np.arange(nelements).reshape(-1, 1), perms]
+
+    for find_indices in [_find_src_node_indices_dense,
+            _find_src_node_indices_kdtree]:
+        assert np.array_equal(find_indices(tgt_nodes, src_nodes, tol), perms)
+
+        # non-unique matches
+        src_nodes_dup = src_nodes.copy()
+        src_nodes_dup[:, :, 1] = src_nodes_dup[:, :, 0]
+        assert find_indices(tgt_nodes, src_nodes_dup, tol) is None
+
+        # no matches
+        assert find_indices(tgt_nodes + 1, src_nodes, tol) is None
+
+
+def test_opposite_face_unit_node_batches(actx_factory):
+    """Check that elements whose unit nodes agree to within the tolerance
+    share a batch, even if they straddle a rounding boundary.
+    """
+    actx = actx_factory()
+
+    import numpy as np
+
+    from meshmode.discretization.connection.opposite_face import (
+        _find_src_unit_nodes_batches)
+
+    rng = np.random.default_rng(seed=42)
+    tol = 1.0e4 * np.finfo(np.float64).eps
+
+    # put a coordinate exactly between two multiples of *tol*
+    unit_nodes = rng.random((2, 6))
+    unit_nodes[0, 0] = 0.5 * tol
+    other_unit_nodes = unit_nodes[:, ::-1]
+
+    nelements = 20
+    is_other = np.arange(nelements) % 3 == 2
+    src_unit_nodes = np.where(
+            is_other.reshape(1, -1, 1),
+            other_unit_nodes.reshape(2, 1, -1),
+            unit_nodes.reshape(2, 1, -1))
+    src_unit_nodes = src_unit_nodes + rng.uniform(
+            -0.1 * tol, 0.1 * tol, size=src_unit_nodes.shape)
+
+    tgt_element_indices = np.arange(nelements)
+    batches = list(_find_src_unit_nodes_batches(
+            actx, src_unit_nodes, 0,
+            tgt_element_indices, tgt_element_indices + 100, tol))
+
+    assert len(batches) == 2
+    for batch, expected in zip(batches, [~is_other, is_other]):
+        to_element_indices = actx.to_numpy(actx.thaw(batch.to_element_indices))
+        from_element_indices = actx.to_numpy(
+                actx.thaw(batch.from_element_indices))
+
+        assert np.array_equal(to_element_indices, np.nonzero(expected)[0])
+        assert np.array_equal(from_element_indices, to_element_indices + 100)
+        assert np.array_equal(batch.result_unit_nodes,
+                src_unit_nodes[:, to_element_indices[0]])
+
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv) > 1:
@@ -20,10 +20,11 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
+import importlib
 import logging
 import pathlib
 from dataclasses import dataclass
-from functools import partial
+from functools import lru_cache, partial
 
 import numpy as np
 import pytest
@@ -34,10 +35,16 @@ from pytools.obj_array import make_obj_array
 import meshmode.mesh.generation as mgen
 from meshmode import _acf  # noqa: F401
 from meshmode.array_context import PytestPyOpenCLArrayContextFactory
+from meshmode.discretization import Discretization
 from meshmode.discretization.poly_element import (
     InterpolatoryQuadratureSimplexGroupFactory,
     LegendreGaussLobattoTensorProductGroupFactory, default_simplex_group_factory)
+from meshmode.discretization.visualization import (
+    make_visualizer, write_nodal_adjacency_vtk_file)
 from meshmode.mesh import SimplexElementGroup, TensorProductElementGroup
+from meshmode.mesh.processing import affine_map
+from meshmode.mesh.visualization import (
+    visualize_mesh_vertex_resampling_error, write_vertex_vtk_file)
 
 
 logger = logging.getLogger(__name__)
@@ -47,8 +54,53 @@ pytest_generate_tests = pytest_generate_tests_for_array_contexts(
 thisdir = pathlib.Path(__file__).parent
 
 
+@lru_cache
+def _is_importable(name):
+    # NOTE: being installed is not enough, e.g. mayavi can fail to import
+    # without a display or a working VTK
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        return False
+    else:
+        return True
+
+
 # {{{ test visualizer
 
+@lru_cache
+def _get_visualizer_test_mesh(dim, group_cls, target_order, nelements=64):
+    # NOTE: meshes are not tied to an array context, so they are shared
+    # between the (parametrized) tests below instead of being regenerated
+    is_simplex = issubclass(group_cls, SimplexElementGroup)
+    if dim == 1:
+        mesh = mgen.make_curve_mesh(
+                mgen.NArmedStarfish(5, 0.25),
+                np.linspace(0.0, 1.0, nelements + 1),
+                target_order)
+    elif dim == 2:
+        if is_simplex:
+            mesh = mgen.generate_torus(5.0, 1.0, order=target_order)
+        else:
+            mesh = mgen.generate_regular_rect_mesh(
+                    a=(0,)*dim, b=(1,)*dim, nelements_per_axis=(4,)*dim,
+                    group_cls=group_cls,
+                    order=target_order)
+    elif dim == 3:
+        if is_simplex:
+            mesh = mgen.generate_warped_rect_mesh(dim, target_order,
+                    nelements_side=4)
+        else:
+            mesh = mgen.generate_regular_rect_mesh(
+                    a=(0,)*dim, b=(1,)*dim, nelements_per_axis=(4,)*dim,
+                    group_cls=group_cls,
+                    order=target_order)
+    else:
+        raise ValueError("unknown dimensionality")
+
+    return mesh
+
+
 @pytest.mark.parametrize("dim", [1, 2, 3])
 def test_parallel_vtk_file(actx_factory, dim):
     r"""
@@ -60,26 +112,12 @@ def test_parallel_vtk_file(actx_factory, dim):
 
     actx = actx_factory()
 
-    nelements = 64
     target_order = 4
+    mesh = _get_visualizer_test_mesh(dim, SimplexElementGroup, target_order)
 
-    if dim == 1:
-        mesh = mgen.make_curve_mesh(
-                mgen.NArmedStarfish(5, 0.25),
-                np.linspace(0.0, 1.0, nelements + 1),
-                target_order)
-    elif dim == 2:
-        mesh = mgen.generate_torus(5.0, 1.0, order=target_order)
-    elif dim == 3:
-        mesh = mgen.generate_warped_rect_mesh(dim, target_order, nelements_side=4)
-    else:
-        raise ValueError("unknown dimensionality")
-
-    from meshmode.discretization import Discretization
     discr = Discretization(actx, mesh,
             InterpolatoryQuadratureSimplexGroupFactory(target_order))
 
-    from meshmode.discretization.visualization import make_visualizer
     vis = make_visualizer(actx, discr, target_order)
 
     class FakeComm:
@@ -92,12 +130,14 @@ def test_parallel_vtk_file(actx_factory, dim):
     file_name_pattern = f"visualizer_vtk_linear_{dim}_{{rank}}.vtu"
     pvtu_filename = file_name_pattern.format(rank=0).replace("vtu", "pvtu")
 
+    # NOTE: the fields are only read, so all of them can share the same array
+    zeros = discr.zeros(actx)
     vis.write_parallel_vtk_file(
             FakeComm(),
             file_name_pattern,
             [
-                ("scalar", discr.zeros(actx)),
-                ("vector", make_obj_array([discr.zeros(actx) for i in range(dim)]))
+                ("scalar", zeros),
+                ("vector", make_obj_array([zeros] * dim))
                 ],
             overwrite=True)
 
@@ -123,50 +163,24 @@ class VisualizerData:
 def test_visualizers(actx_factory, dim, group_cls):
     actx = actx_factory()
 
-    nelements = 64
     target_order = 4
+    mesh = _get_visualizer_test_mesh(dim, group_cls, target_order)
 
     is_simplex = issubclass(group_cls, SimplexElementGroup)
-    if dim == 1:
-        mesh = mgen.make_curve_mesh(
-                mgen.NArmedStarfish(5, 0.25),
-                np.linspace(0.0, 1.0, nelements + 1),
-                target_order)
-    elif dim == 2:
-        if is_simplex:
-            mesh = mgen.generate_torus(5.0, 1.0, order=target_order)
-        else:
-            mesh = mgen.generate_regular_rect_mesh(
-                    a=(0,)*dim, b=(1,)*dim, nelements_per_axis=(4,)*dim,
-                    group_cls=group_cls,
-                    order=target_order)
-    elif dim == 3:
-        if is_simplex:
-            mesh = mgen.generate_warped_rect_mesh(dim, target_order,
-                    nelements_side=4)
-        else:
-            mesh = mgen.generate_regular_rect_mesh(
-                    a=(0,)*dim, b=(1,)*dim, nelements_per_axis=(4,)*dim,
-                    group_cls=group_cls,
-                    order=target_order)
-    else:
-        raise ValueError("unknown dimensionality")
 
     if is_simplex:
         group_factory = InterpolatoryQuadratureSimplexGroupFactory
     else:
         group_factory = LegendreGaussLobattoTensorProductGroupFactory
 
-    from meshmode.discretization import Discretization
     discr = Discretization(actx, mesh, group_factory(target_order))
 
     nodes = actx.thaw(discr.nodes())
-    f = actx.np.sqrt(sum(nodes**2)) + 1j*nodes[0]
+    f = actx.np.sqrt(nodes @ nodes) + 1j*nodes[0]
     g = VisualizerData(g=f)
     names_and_fields = [("f", f), ("g", g)]
     names_and_fields = [("f", f)]
 
-    from meshmode.discretization.visualization import make_visualizer
     vis = make_visualizer(actx, discr)
 
     # {{{ vtk
@@ -183,21 +197,21 @@ def test_visualizers(actx_factory, dim, group_cls):
 
     # {{{ vtkhdf
 
-    try:
+    if _is_importable("h5py"):
         basename = f"visualizer_vtkhdf_{eltype}_{dim}d"
         vis.write_vtkhdf_file(f"{basename}_linear.hdf",
                               names_and_fields, overwrite=True)
-    except ImportError:
+    else:
         logger.info("h5py not available")
 
     # }}}
 
     # {{{ xdmf
 
-    try:
+    if _is_importable("h5py"):
         basename = f"visualizer_xdmf_{eltype}_{dim}d"
         vis.write_xdmf_file(f"{basename}.xmf", names_and_fields, overwrite=True)
-    except ImportError:
+    else:
         logger.info("h5py not available")
 
     # }}}
@@ -205,19 +219,20 @@ def test_visualizers(actx_factory, dim, group_cls):
     # {{{ matplotlib
 
     if mesh.dim == 2 and is_simplex:
-        try:
+        if (_is_importable("matplotlib.pyplot")
+                and _is_importable("mpl_toolkits.mplot3d")):
             # NOTE: matplotlib only supports real fields
             vis.show_scalar_in_matplotlib_3d(actx.np.real(f), do_show=False)
-        except ImportError:
+        else:
             logger.info("matplotlib not available")
     # }}}
 
     # {{{ mayavi
 
     if mesh.dim <= 2 and is_simplex:
-        try:
+        if _is_importable("mayavi.mlab"):
             vis.show_scalar_in_mayavi(f, do_show=False)
-        except ImportError:
+        else:
             logger.info("mayavi not available")
 
     # }}}
@@ -230,11 +245,11 @@ def test_visualizers(actx_factory, dim, group_cls):
     vis.write_vtk_file(f"{basename}_lagrange.vtu",
             names_and_fields, overwrite=True, use_high_order=True)
 
-    try:
+    if _is_importable("h5py"):
         basename = f"visualizer_vtkhdf_{eltype}_{dim}d"
         vis.write_vtkhdf_file(f"{basename}_lagrange.hdf",
                 names_and_fields, overwrite=True, use_high_order=True)
-    except ImportError:
+    else:
         logger.info("h5py not available")
 
     # }}}
@@ -257,17 +272,14 @@ def test_copy_visualizer(actx_factory, ambient_dim, visualize=True):
     else:
         raise ValueError(f"unsupported dimension: {ambient_dim}")
 
-    from meshmode.mesh.processing import affine_map
     translated_mesh = affine_map(mesh,
             b=np.array([2.5, 0.0, 0.0][:ambient_dim])
             )
 
-    from meshmode.discretization import Discretization
     grp_factory = default_simplex_group_factory(ambient_dim, target_order)
     discr = Discretization(actx, mesh, grp_factory)
     translated_discr = Discretization(actx, translated_mesh, grp_factory)
 
-    from meshmode.discretization.visualization import make_visualizer
     vis = make_visualizer(actx, discr, target_order, force_equidistant=True)
     assert vis._vtk_linear_connectivity
     assert vis._vtk_lagrange_connectivity
@@ -298,34 +310,27 @@ def test_vtk_overwrite(actx_factory):
     pytest.importorskip("pyvisfile")
 
     def _try_write_vtk(writer, obj):
-        import os
+        # NOTE: a fresh directory ensures the file does not exist to begin
+        # with, and is cleaned up afterwards without any further checks
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = str(pathlib.Path(tmpdir) / "vtk_overwrite_temp.vtu")
 
-        filename = "vtk_overwrite_temp.vtu"
-        if os.path.exists(filename):
-            os.remove(filename)
-
-        writer(filename, [])
-        with pytest.raises(FileExistsError):
             writer(filename, [])
+            with pytest.raises(FileExistsError):
+                writer(filename, [])
 
-        writer(filename, [], overwrite=True)
-        if os.path.exists(filename):
-            os.remove(filename)
+            writer(filename, [], overwrite=True)
 
     actx = actx_factory()
     target_order = 7
 
     mesh = mgen.generate_torus(10.0, 2.0, order=target_order)
 
-    from meshmode.discretization import Discretization
     discr = Discretization(
             actx, mesh,
             InterpolatoryQuadratureSimplexGroupFactory(target_order))
 
-    from meshmode.discretization.visualization import (
-        make_visualizer, write_nodal_adjacency_vtk_file)
-    from meshmode.mesh.visualization import write_vertex_vtk_file
-
     vis = make_visualizer(actx, discr, 1)
     _try_write_vtk(vis.write_vtk_file, discr)
 
@@ -349,7 +354,6 @@ def test_visualize_mesh_resampling_error(actx_factory):
                                unit_nodes=quad.nodes,
                                node_vertex_consistency_tolerance=False)
 
-    from meshmode.mesh.visualization import visualize_mesh_vertex_resampling_error
     visualize_mesh_vertex_resampling_error(
         actx, mesh, "visualize_resampling_error.vtu", overwrite=True)
 